@@ -35,10 +35,17 @@ def reload_modules():
     cgt_imports.manage_imports(reload=True)
 
 
-if "bl_info" in locals():
-    reload_modules()
+try:
+    import bpy
+except ModuleNotFoundError:
+    # detection worker processes import the package outside of blender
+    bpy = None
 
-from .cgt_blender.interface import ui_registration
+if bpy is not None:
+    if "bl_info" in locals():
+        reload_modules()
+
+    from .cgt_blender.interface import ui_registration
 
 
 def register():
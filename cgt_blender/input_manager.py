@@ -27,6 +27,31 @@ def transfer_animation():
         col_mapping[col](armature, driver_objects)
 
 
+def get_keyframe_tolerances(user):
+    """ tolerances of keyframe reduction per data path. """
+    return {
+        "location": user.location_tolerance,
+        "rotation_euler": user.rotation_tolerance,
+        "scale": user.scale_tolerance,
+    }
+
+
+def decimate_keyframes():
+    """ decimates the keyframes of the objects in the selected driver collection.
+    returns the key count before and after and the max error. """
+    user = bpy.context.scene.m_cgtinker_mediapipe
+    tolerances = get_keyframe_tolerances(user)
+
+    before, after, max_error = 0, 0, 0.0
+    for col in objects.get_child_collections(user.selected_driver_collection):
+        for obj in objects.get_objects_from_collection(col) or []:
+            obj_before, obj_after, obj_error = objects.decimate_fcurves(obj, tolerances)
+            before, after, max_error = before + obj_before, after + obj_after, max(max_error, obj_error)
+
+    print(f"DECIMATED KEYFRAMES: {before} -> {after}, max error {max_error:.5f}")
+    return before, after, max_error
+
+
 def get_keyframe_step():
     try:
         user = bpy.context.scene.m_cgtinker_mediapipe
@@ -39,3 +64,13 @@ def get_keyframe_step():
 def get_frame_start():
     frame = objects.get_frame_start()
     return frame
+
+
+def get_frame_clock(user, origin: float = None):
+    """ clock placing detections at their capture time, None if they get placed every key step.
+    live detections may get rounded to the key grid, recorded takes get resampled instead. """
+    from ..cgt_bridge import events
+    if user is None or user.enum_frame_timing == 'STEP':
+        return None
+    step = user.key_frame_step if user.enum_record_mode == 'LIVE' and user.key_grid else 0
+    return events.TimestampClock(get_frame_start(), objects.get_scene_fps(), step, origin)
@@ -1,4 +1,6 @@
 import importlib
+from functools import partial
+
 import bpy
 
 
@@ -10,28 +12,68 @@ class WM_modal_detection_operator(bpy.types.Operator):
     _timer = None
     tracking_handler = None
     user = None
+    # adapts the detection of the running webcam session, shared with the panel
+    governor = None
 
     @staticmethod
     def set_detection_type(detection_type):
-        from ...cgt_detection import detect_hands, detect_pose, detect_face
+        from ...cgt_detection import detect_hands, detect_pose, detect_face, detect_holistic
 
         handlers = {
             "POSE": detect_pose.PoseDetector,
             "HAND": detect_hands.HandDetector,
             "FACE": detect_face.FaceDetector,
-            "HOLISTIC": ""
+            "HOLISTIC": detect_holistic.HolisticDetector
         }
 
         return handlers[detection_type]
 
+    @staticmethod
+    def set_preview_policy(stream, user):
+        """ applies the users preview policy to the stream, previews fully if the add-on isn't registered. """
+        if user is None:
+            return
+        stream.preview = user.enum_preview != 'OFF'
+        stream.preview_every = user.preview_every if user.enum_preview == 'EVERY_NTH' else 1
+        stream.preview_scale = 0.5 if user.enum_preview == 'LOW_RES' else 1.0
+
+    @staticmethod
+    def get_receiver(user, origin: float = None):
+        """ bridge receiver of the users record mode and frame timing.
+        the origin is the capture timestamp of frame start, f.e. 0 for video files. """
+        from ...cgt_bridge import events
+        from .. import input_manager
+        if user is None:
+            return events.BpyUpdateReceiver
+
+        clock = input_manager.get_frame_clock(user, origin)
+        if user.enum_record_mode == 'LIVE':
+            # still channels don't get keyed
+            dead_bands = input_manager.get_keyframe_tolerances(user) if user.sparse_keying else None
+            return partial(events.BpyUpdateReceiver, dead_bands=dead_bands, clock=clock)
+
+        # recorded takes get post processed before baking
+        resample_step = 1.0 if user.resample_take else 0
+        return partial(events.MemoryUpdateReceiver, smooth_window=user.take_smoothing, resample_step=resample_step,
+                       clock=clock)
+
+    @staticmethod
+    def get_update_rate(user):
+        """ updates per second of live bridges, recorded takes receive every frame. """
+        if user is None or user.enum_record_mode != 'LIVE':
+            return 0.0
+        return float(user.live_update_rate)
+
     def execute(self, context):
+        from ...cgt_utils import stream
         print("RUNNING MP AS TIMER DETECTION MODAL")
 
         # default detection type for testing while add-on is not registered
-        detection_type = 'HAND'
+        detection_type, record_mode = 'HAND', 'LIVE'
         try:
             self.user = context.scene.m_cgtinker_mediapipe # noqa
             detection_type = self.user.enum_detection_type
+            record_mode = self.user.enum_record_mode
         except AttributeError:
             print("CGT USER NOT FOUND")
             self.user = None
@@ -40,8 +82,18 @@ class WM_modal_detection_operator(bpy.types.Operator):
         self.init_detector(detection_type)
 
         # add a timer property and start running
+        # recorded footage gets processed as fast as the inference allows,
+        # recording to memory keeps up with the camera as bpy doesn't update while detecting
+        interval = 0.1
+        if isinstance(self.tracking_handler.stream, stream.VideoFileSource):
+            interval = 0.0
+        elif self.user is not None and self.user.adaptive_rate:
+            interval = self.init_governor(self.user.target_fps)
+        elif record_mode == 'MEMORY':
+            interval = 1 / self.tracking_handler.stream.fps
+
         wm = context.window_manager
-        self._timer = wm.event_timer_add(0.1, window=context.window)
+        self._timer = wm.event_timer_add(interval, window=context.window)
         context.window_manager.modal_handler_add(self)
         return {'RUNNING_MODAL'}
 
@@ -52,15 +104,41 @@ class WM_modal_detection_operator(bpy.types.Operator):
         self.tracking_handler = self.set_detection_type(detection_type)()
 
         # default camera index if add-on is not registered
-        camera_index = 0
+        camera_index, data_path = 0, ""
         if self.user is not None:
             camera_index = self.user.webcam_input_device
+            data_path = bpy.path.abspath(self.user.data_path)
 
         # init tracking handler targets
-        self.tracking_handler.stream = stream.Webcam(camera_index=camera_index)
+        if data_path:
+            self.tracking_handler.stream = stream.VideoFileSource(data_path)
+        else:
+            self.tracking_handler.stream = stream.ThreadedWebcam(camera_index=camera_index)
+        self.set_preview_policy(self.tracking_handler.stream, self.user)
         self.tracking_handler.initialize_model()
-        self.tracking_handler.init_bpy_bridge()
-        self.tracking_handler.listener.attach(self.tracking_handler.observer)
+        if self.user is not None and self.user.smooth_landmarks:
+            self.tracking_handler.init_filter()
+        # video files provide media timestamps
+        self.tracking_handler.init_bpy_bridge(self.get_receiver(self.user, 0.0 if data_path else None))
+        self.tracking_handler.attach_observer(self.get_update_rate(self.user))
+
+    def init_governor(self, target_fps):
+        """ measures the detection stages to hold the target frame rate, returns the initial interval. """
+        from ...cgt_detection import rate_governor
+        session = self.tracking_handler.session
+        cls = WM_modal_detection_operator
+        cls.governor = rate_governor.RateGovernor(target_fps, session.kwargs.get('model_complexity'))
+        self.tracking_handler.stage_timer = cls.governor.timer
+        for observer, _ in self.tracking_handler.bridge_observers():
+            observer.stage_timer = cls.governor.timer
+        return cls.governor.interval
+
+    @classmethod
+    def governor_state(cls):
+        """ settings and measured stage times of the governed detection, None if not governed. """
+        if cls.governor is None:
+            return None
+        return cls.governor.state()
 
     @classmethod
     def poll(cls, context):
@@ -68,7 +146,18 @@ class WM_modal_detection_operator(bpy.types.Operator):
 
     def modal(self, context, event):
         if event.type == "TIMER":
-            rt_event = self.tracking_handler.image_detection()
+            try:
+                rt_event = self.tracking_handler.image_detection()
+            except Exception:
+                # blender drops the modal handler without cancelling, the session and stream have to be released
+                self.cancel(context)
+                raise
+            if rt_event == {'CANCELLED'}:
+                return self.cancel(context)
+            if self.governor is not None and self.governor.govern(self.tracking_handler):
+                wm = context.window_manager
+                wm.event_timer_remove(self._timer)
+                self._timer = wm.event_timer_add(self.governor.interval, window=context.window)
             return rt_event
 
         if event.type in {'RIGHTMOUSE', 'ESC', 'Q'}:
@@ -77,8 +166,260 @@ class WM_modal_detection_operator(bpy.types.Operator):
         return {'PASS_THROUGH'}
 
     def cancel(self, context):
-        del self.tracking_handler
+        from ...cgt_utils import stream
         wm = context.window_manager
         wm.event_timer_remove(self._timer)
-        print("CANCELLED DETECTION")
+        WM_modal_detection_operator.governor = None
+        try:
+            self.tracking_handler.flush_observers()
+        finally:
+            self.tracking_handler.close_session()
+            self.tracking_handler.stream.release()
+            if isinstance(self.tracking_handler.stream, stream.ThreadedWebcam):
+                s = self.tracking_handler.stream
+                print(f"WEBCAM: read {s.consumed}, dropped {s.dropped}, idle updates {s.idle}")
+            del self.tracking_handler
+            print("CANCELLED DETECTION")
         return {'CANCELLED'}
+
+
+class WM_batch_detection_operator(bpy.types.Operator):
+    bl_label = "Batch Detection Operator"
+    bl_idname = "wm.cgt_batch_detection_operator"
+    bl_description = "Detect solution in the video file as fast as possible and apply the results at once."
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'OBJECT'
+
+    def execute(self, context):
+        from ...cgt_bridge import events
+        from ...cgt_detection import sharded_detection
+        from .. import input_manager
+        print("RUNNING MP AS BATCH DETECTION")
+
+        user = context.scene.m_cgtinker_mediapipe
+        data_path = bpy.path.abspath(user.data_path)
+        if not data_path:
+            self.report({'ERROR'}, "Batch detection requires a video file path.")
+            return {'CANCELLED'}
+
+        # init tracking handler which stacks results till the footage has been processed
+        detector = WM_modal_detection_operator.set_detection_type(user.enum_detection_type)
+        tracking_handler = detector()
+        tracking_handler.init_bpy_bridge(
+            partial(events.BatchUpdateReceiver, clock=input_manager.get_frame_clock(user, 0.0)))
+        tracking_handler.attach_observer()
+
+        wm = context.window_manager
+        try:
+            processes = user.detection_processes
+            if processes > 1 and not sharded_detection.can_shard(sharded_detection.video_frame_count(data_path), processes):
+                # the container doesn't report enough frames to split them
+                print("FRAME COUNT UNKNOWN OR TOO SMALL TO SHARD, DETECTING IN A SINGLE PROCESS")
+                processes = 1
+
+            if processes > 1:
+                self.sharded_detection(
+                    wm, tracking_handler, detector, data_path, processes, user.smooth_landmarks)
+            else:
+                self.stream_detection(wm, tracking_handler, data_path, user)
+
+            # apply results
+            tracking_handler.flush_observers()
+        finally:
+            # failed detections release the model session and footage as well
+            wm.progress_end()
+            tracking_handler.close_session()
+            if tracking_handler.stream is not None:
+                tracking_handler.stream.release()
+            del tracking_handler
+
+        print("FINISHED BATCH DETECTION")
+        return {'FINISHED'}
+
+    @staticmethod
+    def stream_detection(wm, tracking_handler, data_path, user):
+        """ detects the footage in blenders process. """
+        from ...cgt_utils import stream
+        tracking_handler.stream = stream.VideoFileSource(data_path)
+        WM_modal_detection_operator.set_preview_policy(tracking_handler.stream, user)
+        tracking_handler.initialize_model()
+        if user.smooth_landmarks:
+            tracking_handler.init_filter()
+
+        source = tracking_handler.stream
+        # without frame count the progress can't be reported
+        known = source.frame_end is not None
+        wm.progress_begin(0, source.frame_end - source.frame_start if known else 1)
+
+        def report_progress(s):
+            if s.updated and known:
+                wm.progress_update(s.frame_index - s.frame_start)
+
+        tracking_handler.stream_detection(report_progress)
+
+    @staticmethod
+    def sharded_detection(wm, tracking_handler, detector, data_path, processes, smooth=False):
+        """ detects frame ranges of the footage in worker processes and stitches the results in frame order. """
+        from ...cgt_detection import sharded_detection
+        wm.progress_begin(0, 1)
+
+        def report_progress(processed, frame_count):
+            wm.progress_update(processed / frame_count)
+
+        results = sharded_detection.sharded_detection(
+            detector, data_path, processes, callback=report_progress, smooth=smooth)
+        for frame_index, timestamp, data in results:
+            tracking_handler.listener.data = data
+            tracking_handler.update_listeners(timestamp)
+
+
+class WM_detector_process_operator(bpy.types.Operator):
+    bl_label = "Detector Process Operator"
+    bl_idname = "wm.cgt_detector_process_operator"
+    bl_description = "Toggle detection in a separate process, results get received without blocking blender."
+
+    # the detection outlives the operator, a timer receives the results
+    detector_process, tracking_handler, receiver, timer = None, None, None, None
+    interval = 1 / 60
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'OBJECT'
+
+    def execute(self, context):
+        from ...cgt_bridge import ring_receiver
+        from ...cgt_detection import detector_process
+        from .. import input_manager
+        cls = WM_detector_process_operator
+
+        if cls.detector_process is not None:
+            # blender drops timers which raised
+            if bpy.app.timers.is_registered(cls.timer):
+                bpy.app.timers.unregister(cls.timer)
+            cls.stop()
+            return {'FINISHED'}
+
+        print("RUNNING MP IN DETECTOR PROCESS")
+        user = context.scene.m_cgtinker_mediapipe
+        detector = WM_modal_detection_operator.set_detection_type(user.enum_detection_type)
+
+        # the tracking handler only bridges the received results
+        cls.tracking_handler = detector()
+        origin = 0.0 if user.data_path else None
+        cls.tracking_handler.init_bpy_bridge(WM_modal_detection_operator.get_receiver(user, origin))
+        cls.tracking_handler.attach_observer(WM_modal_detection_operator.get_update_rate(user))
+
+        cls.detector_process = detector_process.DetectorProcess(
+            detector, user.enum_detection_type,
+            camera_index=user.webcam_input_device,
+            path=bpy.path.abspath(user.data_path),
+            frame_start=input_manager.get_frame_start(),
+            key_step=input_manager.get_keyframe_step(),
+            smooth=user.smooth_landmarks)
+        cls.receiver = ring_receiver.RingReceiver(
+            cls.detector_process.ring, cls.detector_process.solution, cls.tracking_handler.listener)
+
+        cls.detector_process.start()
+        cls.timer = cls.receive
+        bpy.app.timers.register(cls.timer, first_interval=cls.interval)
+        return {'FINISHED'}
+
+    @classmethod
+    def receive(cls):
+        """ drains the ring, stops once the detector process has finished. """
+        cls.receiver.drain()
+        if not cls.detector_process.is_alive:
+            cls.stop()
+            return None
+        return cls.interval
+
+    @classmethod
+    def stop(cls):
+        cls.detector_process.stop()
+        cls.receiver.drain()
+        cls.tracking_handler.flush_observers()
+
+        header = cls.detector_process.ring.header
+        print(f"DETECTOR PROCESS: published {int(header['published'])}, skipped {int(header['skipped'])}, "
+              f"consumed {cls.receiver.consumed}, dropped {cls.receiver.dropped}")
+        cls.detector_process.close()
+        cls.detector_process, cls.tracking_handler, cls.receiver, cls.timer = None, None, None, None
+        print("STOPPED DETECTOR PROCESS")
+
+    @classmethod
+    def counters(cls):
+        """ producer and consumer counters of the running detection, None if not running. """
+        if cls.detector_process is None:
+            return None
+        header = cls.detector_process.ring.header
+        return {
+            "published": int(header['published']),
+            "skipped": int(header['skipped']),
+            "detect_latency": float(header['detect_latency']),
+            "consumed": int(header['consumed']),
+            "dropped": int(header['dropped']),
+            "latency": float(header['latency']),
+        }
+
+
+class WM_socket_receiver_operator(bpy.types.Operator):
+    bl_label = "Socket Receiver Operator"
+    bl_idname = "wm.cgt_socket_receiver_operator"
+    bl_description = "Toggle receiving detection results streamed by a detector from another process or container."
+
+    # receiving outlives the operator, a timer drains the socket
+    tracking_handler, receiver, timer = None, None, None
+    interval = 1 / 60
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'OBJECT'
+
+    def execute(self, context):
+        from ...cgt_bridge import payload, socket_receiver
+        cls = WM_socket_receiver_operator
+
+        if cls.receiver is not None:
+            # blender drops timers which raised
+            if bpy.app.timers.is_registered(cls.timer):
+                bpy.app.timers.unregister(cls.timer)
+            cls.stop()
+            return {'FINISHED'}
+
+        user = context.scene.m_cgtinker_mediapipe
+        detector = WM_modal_detection_operator.set_detection_type(user.enum_detection_type)
+
+        # the tracking handler only bridges the received results
+        cls.tracking_handler = detector()
+        cls.tracking_handler.init_bpy_bridge(WM_modal_detection_operator.get_receiver(user))
+        cls.tracking_handler.attach_observer(WM_modal_detection_operator.get_update_rate(user))
+
+        try:
+            cls.receiver = socket_receiver.SocketReceiver(
+                cls.tracking_handler.listener, payload.SOLUTIONS[user.enum_detection_type], user.socket_address)
+        except (OSError, ValueError) as e:
+            cls.tracking_handler = None
+            self.report({'ERROR'}, f"Cannot listen on {user.socket_address}: {e}")
+            return {'CANCELLED'}
+
+        print(f"RECEIVING DETECTION RESULTS ON {user.socket_address}")
+        cls.timer = cls.receive
+        bpy.app.timers.register(cls.timer, first_interval=cls.interval)
+        return {'FINISHED'}
+
+    @classmethod
+    def receive(cls):
+        cls.receiver.drain()
+        return cls.interval
+
+    @classmethod
+    def stop(cls):
+        cls.receiver.drain()
+        cls.tracking_handler.flush_observers()
+        print(f"SOCKET RECEIVER: consumed {cls.receiver.consumed}, ignored {cls.receiver.ignored}, "
+              f"received {cls.receiver.received_bytes} bytes")
+        cls.receiver.close()
+        cls.tracking_handler, cls.receiver, cls.timer = None, None, None
+        print("STOPPED SOCKET RECEIVER")
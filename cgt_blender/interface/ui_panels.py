@@ -3,7 +3,8 @@ from bpy.types import Panel
 
 from ... import cgt_naming
 from .. import input_manager
-from . import ui_preferences
+from . import ui_preferences, stream_detection_operator
+from ...cgt_utils.profiler import profiler
 from ..utils import install_dependencies
 
 
@@ -34,11 +35,61 @@ class UI_PT_main_panel(DefaultPanel, Panel):
         box = self.layout.box()
         box.label(text='Detect')
         box.row().prop(user, "webcam_input_device")
-        # box.row().prop(user, "data_path")
+        box.row().prop(user, "data_path")
         box.row().prop(user, "key_frame_step")
         box.row().prop(user, "enum_detection_type")
+        box.row().prop(user, "enum_record_mode")
+        box.row().prop(user, "enum_frame_timing")
+        if user.enum_record_mode == 'MEMORY':
+            box.row().prop(user, "take_smoothing")
+            box.row().prop(user, "resample_take")
+        else:
+            box.row().prop(user, "sparse_keying")
+            box.row().prop(user, "live_update_rate")
+            if user.enum_frame_timing == 'TIME':
+                box.row().prop(user, "key_grid")
+        box.row().prop(user, "smooth_landmarks")
+        box.row().prop(user, "enum_preview")
+        if user.enum_preview == 'EVERY_NTH':
+            box.row().prop(user, "preview_every")
+        box.row().prop(user, "adaptive_rate")
+        if user.adaptive_rate:
+            box.row().prop(user, "target_fps")
         box.row().operator("wm.cgt_feature_detection_operator", text=user.button_start_detection)
 
+        # settings and frame time of the governed detection
+        state = stream_detection_operator.WM_modal_detection_operator.governor_state()
+        if state is not None:
+            complexity = "" if state['complexity'] is None else f", complexity {state['complexity']}"
+            box.label(text=f"Governor: scale {state['scale']:.2f}{complexity}, interval {state['interval'] * 1000:.0f} ms")
+            box.label(text=f"Frame: {state['total'] * 1000:.1f} of {state['budget'] * 1000:.1f} ms")
+            box.label(text=f"Capture {state['capture'] * 1000:.1f}, inference {state['inference'] * 1000:.1f}, "
+                           f"preview {state['preview'] * 1000:.1f} ms")
+            box.label(text=f"Bridge {state['bridge'] * 1000:.1f}, keying {state['keying'] * 1000:.1f} ms")
+        if user.data_path:
+            box.row().prop(user, "detection_processes")
+            box.row().operator("wm.cgt_batch_detection_operator", text=user.button_batch_detection)
+
+        # detection in a separate process
+        counters = stream_detection_operator.WM_detector_process_operator.counters()
+        if counters is None:
+            box.row().operator("wm.cgt_detector_process_operator", text=user.button_detector_process)
+        else:
+            box.row().operator("wm.cgt_detector_process_operator", text="Stop Detector Process")
+            box.label(text=f"Detector: {counters['published']} published, {counters['skipped']} skipped, "
+                           f"{counters['detect_latency'] * 1000:.1f} ms")
+            box.label(text=f"Receiver: {counters['consumed']} consumed, {counters['dropped']} dropped, "
+                           f"{counters['latency'] * 1000:.1f} ms")
+
+        # detection results streamed from another process
+        socket_receiver = stream_detection_operator.WM_socket_receiver_operator.receiver
+        box.row().prop(user, "socket_address")
+        if socket_receiver is None:
+            box.row().operator("wm.cgt_socket_receiver_operator", text=user.button_socket_receiver)
+        else:
+            box.row().operator("wm.cgt_socket_receiver_operator", text="Stop Socket Receiver")
+            box.label(text=f"Receiver: {socket_receiver.consumed} consumed, {socket_receiver.received_bytes} bytes")
+
         # transfer animation
         box = self.layout.box()
 
@@ -57,6 +108,33 @@ class UI_PT_main_panel(DefaultPanel, Panel):
 
         box.row(align=True).operator("button.cgt_transfer_animation_button", text=user.button_transfer_animation)
 
+        # decimate driver keyframes
+        box = self.layout.box()
+        box.label(text='Keyframe Reduction')
+        box.row().prop(user, "location_tolerance")
+        box.row().prop(user, "rotation_tolerance")
+        box.row().prop(user, "scale_tolerance")
+        box.row(align=True).operator("button.cgt_decimate_keyframes_button", text=user.button_decimate_keyframes)
+
+
+class UI_PT_profiler_panel(DefaultPanel, Panel):
+    bl_label = "Profiling"
+    bl_idname = "OBJECT_PT_cgt_profiler_panel"
+
+    def draw(self, context):
+        user = context.scene.m_cgtinker_mediapipe
+
+        box = self.layout.box()
+        text = "Stop Profiling" if profiler.enabled else "Start Profiling"
+        box.row().operator("button.cgt_toggle_profiling_button", text=text)
+
+        # rolling percentiles per stage in ms
+        for stage, (count, mean, p50, p95, p99) in profiler.summary().items():
+            box.label(text=f"{stage}: p50 {p50 * 1000:.2f}, p95 {p95 * 1000:.2f}, p99 {p99 * 1000:.2f} ms ({count})")
+
+        box.row().prop(user, "profile_path")
+        box.row().operator("button.cgt_dump_profile_button", text=user.button_dump_profile)
+
 
 class UI_PT_warning_panel(DefaultPanel, Panel):
     bl_label = cgt_naming.ADDON_NAME
@@ -89,3 +167,44 @@ class UI_transfer_anim_button(bpy.types.Operator):
     def execute(self, context):
         input_manager.transfer_animation()
         return {'FINISHED'}
+
+
+class UI_decimate_keyframes_button(bpy.types.Operator):
+    bl_label = "Decimate Keyframes"
+    bl_idname = "button.cgt_decimate_keyframes_button"
+    bl_description = "Remove keyframes of the drivers which the remaining keyframes interpolate within tolerance"
+
+    def execute(self, context):
+        before, after, max_error = input_manager.decimate_keyframes()
+        reduction = (1 - after / before) * 100 if before else 0
+        self.report({'INFO'}, f"Keyframes reduced by {reduction:.1f}% ({before} -> {after}), max error {max_error:.5f}")
+        return {'FINISHED'}
+
+
+class UI_toggle_profiling_button(bpy.types.Operator):
+    bl_label = "Toggle Profiling"
+    bl_idname = "button.cgt_toggle_profiling_button"
+    bl_description = "Record the timings of the detection and bridge stages"
+
+    def execute(self, context):
+        if not profiler.enabled:
+            profiler.clear()
+        profiler.enabled = not profiler.enabled
+        return {'FINISHED'}
+
+
+class UI_dump_profile_button(bpy.types.Operator):
+    bl_label = "Write Profile"
+    bl_idname = "button.cgt_dump_profile_button"
+    bl_description = "Write the profiled stage timings as csv"
+
+    def execute(self, context):
+        user = context.scene.m_cgtinker_mediapipe
+        file_name = bpy.path.abspath(user.profile_path)
+        try:
+            profiler.dump_csv(file_name)
+        except OSError as e:
+            self.report({'ERROR'}, f"Cannot write profile to {file_name}: {e}")
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"Wrote profile of {len(profiler.stages)} stages to {file_name}")
+        return {'FINISHED'}
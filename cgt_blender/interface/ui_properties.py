@@ -1,5 +1,5 @@
 import bpy
-from bpy.props import StringProperty, EnumProperty, IntProperty
+from bpy.props import StringProperty, EnumProperty, IntProperty, BoolProperty, FloatProperty
 from bpy.types import PropertyGroup
 
 
@@ -11,12 +11,42 @@ class CgtProperties(PropertyGroup):
         default="Start Detection"
     )
 
+    button_batch_detection: StringProperty(
+        name="",
+        description="Detects features in the video file as fast as possible and applies results at once.",
+        default="Batch Detection"
+    )
+
+    button_detector_process: StringProperty(
+        name="",
+        description="Detects features in a separate process and receives results without blocking blender.",
+        default="Start Detector Process"
+    )
+
+    button_socket_receiver: StringProperty(
+        name="",
+        description="Receives detection results streamed from another process or container.",
+        default="Start Socket Receiver"
+    )
+
+    button_dump_profile: StringProperty(
+        name="",
+        description="Writes the profiled stage timings to the profile path.",
+        default="Write Profile CSV"
+    )
+
     button_transfer_animation: StringProperty(
         name="",
         description="Armature as target for detected results.",
         default="Start Transfer"
     )
 
+    button_decimate_keyframes: StringProperty(
+        name="",
+        description="Removes driver keyframes which the remaining keyframes interpolate within tolerance.",
+        default="Decimate Keyframes"
+    )
+
     # DATA SELECTION
     selected_rig: StringProperty(
         name="",
@@ -30,7 +60,6 @@ class CgtProperties(PropertyGroup):
         default="Drivers"
     )
     # ENUMS
-    # ("HOLISTIC", "Holistic", ""),
     enum_detection_type: EnumProperty(
         name="Target",
         description="Select detection type for motion tracking.",
@@ -38,9 +67,72 @@ class CgtProperties(PropertyGroup):
             ("HAND", "Hands", ""),
             ("FACE", "Face", ""),
             ("POSE", "Pose", ""),
+            ("HOLISTIC", "Holistic", "Detect face, hands and pose in one pass."),
         )
     )
 
+    enum_record_mode: EnumProperty(
+        name="Record",
+        description="Select how detection results get recorded.",
+        items=(
+            ("LIVE", "Live", "Update drivers while detecting."),
+            ("MEMORY", "Memory", "Record to memory while detecting and bake keyframes when stopped."),
+        )
+    )
+
+    enum_preview: EnumProperty(
+        name="Preview",
+        description="Select how the detection results get previewed.",
+        items=(
+            ("FULL", "Full", "Preview every frame."),
+            ("EVERY_NTH", "Every Nth Frame", "Preview every nth frame."),
+            ("LOW_RES", "Low Resolution", "Preview every frame at half resolution."),
+            ("OFF", "Off", "Skip drawing and the preview window, cancel the detection in blender."),
+        )
+    )
+
+    enum_frame_timing: EnumProperty(
+        name="Timing",
+        description="Select where detection results get keyed.",
+        items=(
+            ("STEP", "Key Step", "Key detections every key step frames."),
+            ("TIME", "Capture Time", "Key detections at their capture time in scene frames and subframes."),
+        )
+    )
+
+    # Bool Input
+    smooth_landmarks: BoolProperty(
+        name="Smooth Landmarks",
+        description="Filter landmark jitter before keyframing, slow motion gets smoothed while fast motion follows.",
+        default=True
+    )
+
+    resample_take: BoolProperty(
+        name="Resample Take",
+        description="Resample recorded takes to every scene frame, gaps in the detection stay empty.",
+        default=False
+    )
+
+    sparse_keying: BoolProperty(
+        name="Sparse Keying",
+        description="Skip keys of channels changing less than the keyframe reduction tolerances, "
+                    "the last still key gets added when they move again.",
+        default=False
+    )
+
+    adaptive_rate: BoolProperty(
+        name="Adaptive Rate",
+        description="Adapt detection interval, input resolution and model complexity of webcam detection "
+                    "to hold the target frame rate.",
+        default=False
+    )
+
+    key_grid: BoolProperty(
+        name="Key Grid",
+        description="Round capture times to every key step frames.",
+        default=False
+    )
+
     # Integer Input
     webcam_input_device: IntProperty(
         name="Webcam Device Slot",
@@ -58,14 +150,94 @@ class CgtProperties(PropertyGroup):
         default=4
     )
 
+    take_smoothing: IntProperty(
+        name="Take Smoothing",
+        description="Window in detected frames to smooth recorded takes with before baking, 0 disables smoothing.",
+        min=0,
+        max=31,
+        default=0
+    )
+
+    preview_every: IntProperty(
+        name="Preview Every",
+        description="Amount of detected frames per previewed frame.",
+        min=2,
+        max=30,
+        default=3
+    )
+
+    target_fps: IntProperty(
+        name="Target FPS",
+        description="Frame rate the adaptive rate holds, its frame time is the budget of all detection stages.",
+        min=1,
+        max=60,
+        default=15
+    )
+
+    live_update_rate: IntProperty(
+        name="Live Update Rate",
+        description="Updates per second applied to the rig while detecting live, 0 applies every detected frame.",
+        min=0,
+        max=60,
+        default=0
+    )
+
+    detection_processes: IntProperty(
+        name="Processes",
+        description="Amount of processes to detect the video file with in batch detection.",
+        min=1,
+        max=64,
+        default=1
+    )
+
+    # Float Input
+    location_tolerance: FloatProperty(
+        name="Location Tolerance",
+        description="Max location error of removed keyframes.",
+        min=0.0,
+        default=0.001,
+        precision=4
+    )
+
+    rotation_tolerance: FloatProperty(
+        name="Rotation Tolerance",
+        description="Max rotation error of removed keyframes in radians.",
+        min=0.0,
+        default=0.005,
+        precision=4
+    )
+
+    scale_tolerance: FloatProperty(
+        name="Scale Tolerance",
+        description="Max scale error of removed keyframes.",
+        min=0.0,
+        default=0.002,
+        precision=4
+    )
+
     data_path: StringProperty(
         name="File Path",
-        description="File path to .mov file.",
+        description="File path to a video file, leave empty to detect the webcam stream.",
         default="",
         maxlen=1024,
         subtype='FILE_PATH'
     )
 
+    profile_path: StringProperty(
+        name="Profile Path",
+        description="CSV file the profiled stage timings get written to.",
+        default="//profile.csv",
+        maxlen=1024,
+        subtype='FILE_PATH'
+    )
+
+    socket_address: StringProperty(
+        name="Address",
+        description="host:port or unix socket path the socket receiver listens on.",
+        default="127.0.0.1:5005",
+        maxlen=1024
+    )
+
 
 def get_user():
     return bpy.context.scene.m_cgtinker_mediapipe
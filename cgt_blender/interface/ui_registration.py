@@ -12,9 +12,16 @@ def get_classes():
         ui_properties.CgtProperties,
 
         ui_panels.UI_transfer_anim_button,
+        ui_panels.UI_decimate_keyframes_button,
+        ui_panels.UI_toggle_profiling_button,
+        ui_panels.UI_dump_profile_button,
         stream_detection_operator.WM_modal_detection_operator,
+        stream_detection_operator.WM_batch_detection_operator,
+        stream_detection_operator.WM_detector_process_operator,
+        stream_detection_operator.WM_socket_receiver_operator,
 
-        ui_panels.UI_PT_main_panel
+        ui_panels.UI_PT_main_panel,
+        ui_panels.UI_PT_profiler_panel
     )
     return classes
 
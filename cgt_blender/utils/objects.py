@@ -1,4 +1,8 @@
 import bpy
+import numpy as np
+
+from ...cgt_utils import decimation
+from ...cgt_utils.buffers import GrowableArray
 
 
 # region OBJECTS
@@ -212,9 +216,102 @@ def add_copy_rotation_constraint(obj, target_obj, invert_y):
 # endregion
 
 
+# region ANIMATION
+def get_fcurve(obj, data_path, index, action_group="Object Transforms"):
+    """ returns the objects F-curve of a data path index, adds action and F-curve if required. """
+    if obj.animation_data is None:
+        obj.animation_data_create()
+
+    action = obj.animation_data.action
+    if action is None:
+        action = bpy.data.actions.new(f"{obj.name}Action")
+        obj.animation_data.action = action
+
+    fcurve = action.fcurves.find(data_path, index=index)
+    if fcurve is None:
+        fcurve = action.fcurves.new(data_path, index=index, action_group=action_group)
+    return fcurve
+
+
+def get_keyframe_points(fcurve):
+    """ returns keyframes co (N, 2) [[frame, value], ...] of the F-curve. """
+    co = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float32)
+    fcurve.keyframe_points.foreach_get('co', co)
+    return co.reshape(-1, 2)
+
+
+def rebuild_fcurve(obj, fcurve):
+    """ returns an empty F-curve replacing the F-curve, keys cannot be removed in bulk. """
+    data_path, index = fcurve.data_path, fcurve.array_index
+    group = fcurve.group.name if fcurve.group is not None else "Object Transforms"
+    obj.animation_data.action.fcurves.remove(fcurve)
+    return get_fcurve(obj, data_path, index, group)
+
+
+def set_keyframe_points(obj, data_path, index, co: np.array, written: GrowableArray = None):
+    """ adds keyframes co [[frame, value], ...] in frame order to the F-curve in bulk, keys at the same frames get replaced.
+    written caches the keys of the F-curve in frame order between calls, so keys after the last key get appended
+    without reading and merging the previous keys. returns the cache, it gets read from the F-curve if outdated. """
+    fcurve = get_fcurve(obj, data_path, index)
+    count = len(fcurve.keyframe_points)
+    if written is None or len(written) != count:
+        written = GrowableArray((2,), np.float32, capacity=max(256, count + len(co)))
+        written.extend(get_keyframe_points(fcurve))
+
+    if count > 0 and co[0, 0] <= written.data[-1, 0]:
+        # the keys overlap previous keys
+        prev_co = written.data
+        keep = ~np.isin(prev_co[:, 0], co[:, 0])
+        if not keep.all():
+            fcurve = rebuild_fcurve(obj, fcurve)
+            count = 0
+        merged = np.concatenate([prev_co[keep], co])
+        written.clear()
+        written.extend(merged[np.argsort(merged[:, 0], kind='stable')])
+    else:
+        written.extend(co)
+
+    fcurve.keyframe_points.add(len(written) - count)
+    fcurve.keyframe_points.foreach_set('co', written.data.ravel())
+    fcurve.update()
+    return written
+
+
+def decimate_fcurves(obj, tolerances: dict):
+    """ removes keyframes of the objects F-curves which the remaining keys interpolate within the
+    tolerance of their data path. returns the key count before and after and the max error. """
+    before, after, max_error = 0, 0, 0.0
+    if obj.animation_data is None or obj.animation_data.action is None:
+        return before, after, max_error
+
+    for fcurve in list(obj.animation_data.action.fcurves):
+        co = get_keyframe_points(fcurve)
+        keep = decimation.rdp_keep(co, tolerances.get(fcurve.data_path, 0.0))
+        before += len(co)
+        after += int(np.count_nonzero(keep))
+        if keep.all():
+            continue
+
+        max_error = max(max_error, decimation.interpolation_error(co, keep))
+        fcurve = rebuild_fcurve(obj, fcurve)
+        fcurve.keyframe_points.add(np.count_nonzero(keep))
+        fcurve.keyframe_points.foreach_set('co', co[keep].ravel())
+        fcurve.update()
+    return before, after, max_error
+# endregion
+
+
 def get_frame_start():
     try:
         frame_start = bpy.context.scene.frame_start
     except AttributeError:
         return 0
     return frame_start
+
+
+def get_scene_fps():
+    try:
+        render = bpy.context.scene.render
+    except AttributeError:
+        return 24.0
+    return render.fps / render.fps_base
@@ -1,11 +1,10 @@
 from abc import ABC, abstractmethod
-from math import pi
 
-from mathutils import Vector, Euler
+import numpy as np
 
 from ..cgt_blender.utils import objects
 from ..cgt_naming import COLLECTIONS
-from ..cgt_utils import m_V
+from ..cgt_utils.buffers import GrowableArray
 
 
 class CustomData:
@@ -16,13 +15,138 @@ class CustomData:
     obj = None
 
 
+class KeyframeChannel:
+    """ Samples of a data path for all objects of a target.
+    Objects without data at a frame are stored as nan.
+    With a dead band, samples of F-curves which changed less than the dead band since their last key
+    get skipped. When a held F-curve moves again, its last sample gets keyed to close the hold. """
+    def __init__(self, target: list, data_path: str, size: int, dead_band: float = None):
+        self.target = target
+        self.data_path = data_path
+        self.frames = GrowableArray((), np.float32)
+        self.values = GrowableArray((len(target), size), np.float32)
+        # keys written to the F-curves by object and axis, flushes only append to them
+        self.written = {}
+
+        self.dead_band = dead_band
+        if dead_band is not None:
+            self.keyed = np.full((len(target), size), np.nan, dtype=np.float32)
+            self.held = np.zeros((len(target), size), dtype=bool)
+            # last sample per object and its row in the buffer, -1 once flushed
+            self.seen = np.full((len(target), size), np.nan, dtype=np.float32)
+            self.seen_frame = np.zeros(len(target), dtype=np.float32)
+            self.seen_row = np.full(len(target), -1, dtype=np.int64)
+
+    def add(self, frame: float, indices: np.array, values: np.array):
+        if self.dead_band is not None:
+            values = self.skip_still(indices, values)
+
+        # merge samples of the same frame, f.e. landmarks and drivers sharing a target
+        if len(self.frames) == 0 or self.frames.data[-1] != frame:
+            self.frames.append(frame)
+            self.values.append(np.nan)
+        self.values.data[-1, indices] = values
+
+        if self.dead_band is not None:
+            self.seen_frame[indices] = frame
+            self.seen_row[indices] = len(self.frames) - 1
+
+    def skip_still(self, indices: np.array, values: np.array):
+        """ returns the values with nan where the F-curves stay within the dead band of their last key. """
+        values = np.asarray(values, dtype=np.float32)
+        keyed = self.keyed[indices]
+        # nan compares false, so F-curves without keys always move
+        moved = ~(np.abs(values - keyed) <= self.dead_band)
+
+        self.close_holds(indices, moved & self.held[indices])
+        self.held[indices] = ~moved
+        self.keyed[indices] = np.where(moved, values, keyed)
+        self.seen[indices] = values
+        return np.where(moved, values, np.nan)
+
+    def close_holds(self, indices: np.array, closing: np.array):
+        """ keys the last sample of held F-curves which start moving again. """
+        objs = closing.any(axis=1)
+        if not objs.any():
+            return
+        indices, closing = indices[objs], closing[objs]
+
+        # the row of the last sample may have been flushed already
+        flushed = self.seen_row[indices] < 0
+        for frame in np.unique(self.seen_frame[indices[flushed]]):
+            self.frames.append(frame)
+            self.values.append(np.nan)
+            self.seen_row[indices[flushed & (self.seen_frame[indices] == frame)]] = len(self.frames) - 1
+
+        rows = self.seen_row[indices]
+        self.values.data[rows, indices] = np.where(closing, self.seen[indices], self.values.data[rows, indices])
+
+    def extend(self, frames: np.array, indices: np.array, values: np.array):
+        """ appends samples of many frames at once, values (frames, len(indices), size). """
+        rows = np.full((len(frames), *self.values.data.shape[1:]), np.nan, dtype=np.float32)
+        rows[:, indices] = values
+        self.frames.extend(frames)
+        self.values.extend(rows)
+
+    def flush(self):
+        frames, values = self.frames.data, self.values.data
+        keyed = ~np.isnan(values)
+        for idx, axis in zip(*np.nonzero(keyed.any(axis=0))):
+            rows = np.flatnonzero(keyed[:, idx, axis])
+            # closing keys may have been added after later frames, the latest sample of a frame wins
+            rows = rows[np.argsort(frames[rows], kind='stable')]
+            rows = rows[np.append(frames[rows][1:] != frames[rows][:-1], True)]
+
+            co = np.stack([frames[rows], values[rows, idx, axis]], axis=1)
+            self.written[idx, axis] = objects.set_keyframe_points(
+                self.target[idx], self.data_path, axis, co, self.written.get((idx, axis)))
+
+        self.frames.clear()
+        self.values.clear()
+        if self.dead_band is not None:
+            self.seen_row[:] = -1
+
+
+class KeyframeBuffer:
+    """ Collects keyframes per target and data path in arrays.
+    Flushing writes every F-curve in bulk instead of inserting keys one by one.
+    Dead bands per data path skip keys of still F-curves, they apply to channels created afterwards. """
+    def __init__(self, dead_bands: dict = None):
+        self.channels = {}
+        self.dead_bands = dead_bands or {}
+
+    def channel(self, target: list, data_path: str, size: int):
+        key = (id(target), data_path)
+        if key not in self.channels:
+            self.channels[key] = KeyframeChannel(target, data_path, size, self.dead_bands.get(data_path))
+        return self.channels[key]
+
+    def add(self, target: list, data_path: str, frame: float, indices: np.array, values: np.array):
+        self.channel(target, data_path, values.shape[-1]).add(frame, indices, values)
+
+    def extend(self, target: list, data_path: str, frames: np.array, indices: np.array, values: np.array):
+        self.channel(target, data_path, values.shape[-1]).extend(frames, indices, values)
+
+    def flush(self):
+        for channel in self.channels.values():
+            channel.flush()
+
+
 class DataAssignment(ABC):
     data = None
     frame = 0
     references = None
-    prev_rotation = {}
-    memory_stack = {}
     driver_col = COLLECTIONS.drivers
+    # payload solution of the data the bridge consumes
+    solution = None
+    # assigns the latest sample to the objects while buffering keys, so they follow a live capture
+    preview = False
+
+    def __init__(self):
+        self.keyframes = KeyframeBuffer()
+        # raw landmarks of a recorded take
+        self.memory_frames = GrowableArray((), np.float32, capacity=1024)
+        self.memory_stack = None
 
     # region abstract methods
     @abstractmethod
@@ -40,6 +164,16 @@ class DataAssignment(ABC):
         """ updates every mp solution received. """
         pass
 
+    @abstractmethod
+    def memory_landmarks(self, data):
+        """ raw landmarks of a frame as fixed size array, missing data as nan. """
+        pass
+
+    @abstractmethod
+    def bake_memory(self, frames, landmarks):
+        """ derives and keyframes the data of a recorded take. """
+        pass
+
     # endregion
 
     # region init helper
@@ -70,87 +204,97 @@ class DataAssignment(ABC):
 
     # endregion
 
+    # region memory
+    def allocate_memory(self, frame, data):
+        """ stores the raw landmarks of a frame, doesn't touch bpy. """
+        landmarks = self.memory_landmarks(data)
+        if self.memory_stack is None:
+            self.memory_stack = GrowableArray(landmarks.shape, np.float32, capacity=1024)
+        self.memory_frames.append(frame)
+        self.memory_stack.append(landmarks)
+
+    def bake(self, process_take=None):
+        """ derives the data of the recorded take and writes all keyframes in one pass.
+        process take receives and returns the frames and landmarks of the whole take before deriving data. """
+        if len(self.memory_frames) == 0:
+            return
+        frames, landmarks = self.memory_frames.data, self.memory_stack.data
+        if process_take is not None:
+            frames, landmarks = process_take(frames, landmarks)
+        self.bake_memory(frames, landmarks)
+        self.keyframes.flush()
+        self.memory_frames.clear()
+        self.memory_stack.clear()
+
+    # endregion
+
     # region bpy object oriented
     @staticmethod
-    def translate(target, data, frame):
+    def split_data(data):
+        """ returns indices and values of [[idx, value], ...] pairs.
+        rows of a (N, k) array target the objects at the same index. """
+        if isinstance(data, np.ndarray):
+            return np.arange(len(data)), data
+
+        data = list(data)
+        indices = np.array([p[0] for p in data], dtype=np.int64)
+        values = np.array([p[1] for p in data], dtype=np.float32)
+        return indices, values
+
+    def keyframe(self, target, data, frame, data_path, indices=None):
+        """ Buffers keyframes of bpy empty objects, they get written when the keyframes are flushed.
+        With indices, data is an array of values (len(indices), size). """
+        indices, values = self.split_data(data) if indices is None else (indices, data)
+        if len(indices) == 0:
+            return
+        self.keyframes.add(target, data_path, frame, indices, values)
+        if self.preview:
+            self.assign(target, data_path, indices, values)
+
+    @staticmethod
+    def assign(target, data_path, indices, values):
+        """ Sets the data path of the objects to the values, objects without data keep their value. """
+        values = np.asarray(values, dtype=np.float32)
+        for idx, value in zip(indices, values):
+            if not np.isnan(value).any():
+                setattr(target[idx], data_path, value)
+
+    def keyframe_take(self, target, frames, values, data_path, indices=None):
+        """ Buffers keyframes of many frames, values (frames, objects, size).
+        Objects without data at a frame are nan and don't get keyed. """
+        if indices is None:
+            indices = np.arange(values.shape[1])
+        self.keyframes.extend(target, data_path, frames, indices, values)
+
+    def translate(self, target, data, frame):
         """ Translates and keyframes bpy empty objects. """
         try:
-            for p in data:
-                target[p[0]].location = Vector((p[1]))
-                target[p[0]].keyframe_insert(data_path="location", frame=frame)
-
+            self.keyframe(target, data, frame, "location")
         except IndexError:
             print(f"missing translation index at {frame}")
             pass
 
-    @staticmethod
-    def scale(target, data, frame):
+    def scale(self, target, data, frame):
         try:
-            for p in data:
-                target[p[0]].scale = Vector((p[1]))
-                target[p[0]].keyframe_insert(data_path="scale", frame=frame)
+            self.keyframe(target, data, frame, "scale")
         except IndexError:
             print(f"missing scale index at {data}, {frame}")
             pass
 
-    @staticmethod
-    def quaternion_rotate(target, data, frame):
+    def quaternion_rotate(self, target, data, frame):
         """ Translates and keyframes bpy empty objects. """
         try:
-            for p in data:
-                target[p[0]].rotation_quaternion = p[1]
-                target[p[0]].keyframe_insert(data_path="rotation_quaternion", frame=frame)
+            self.keyframe(target, data, frame, "rotation_quaternion")
         except IndexError:
             print(f"missing quat_euler_rotate index {data}, {frame}")
             pass
 
-    def euler_rotate(self, target, data, frame, idx_offset=0):
-        """ Translates and keyframes bpy empty objects. """
+    def euler_rotate(self, target, data, frame):
+        """ Rotates and keyframes bpy empty objects. """
         try:
-            for p in data:
-                target[p[0]].rotation_euler = p[1]
-                target[p[0]].keyframe_insert(data_path="rotation_euler", frame=frame)
-                self.prev_rotation[p[0] + idx_offset] = p[1]
+            self.keyframe(target, data, frame, "rotation_euler")
         except IndexError:
             print(f"missing euler_rotate index at {data}, {frame}")
             pass
 
-    def quart_to_euler_combat(self, quart, idx, idx_offset=0, axis='XYZ'):
-        """ Converts quart to euler rotation while comparing with previous rotation. """
-        if len(self.prev_rotation) > 0:
-            try:
-                combat = self.prev_rotation[idx + idx_offset]
-                return m_V.to_euler(quart, combat, axis)
-            except KeyError:
-                print(f"invalid id to euler combat {idx}, {self.frame}")
-                return m_V.to_euler(quart)
-        else:
-            return m_V.to_euler(quart)
-
-    @staticmethod
-    def offset_euler(euler, offset: []):
-        rotation = Euler((
-            euler[0] + pi * offset[0],
-            euler[1] + pi * offset[1],
-            euler[2] + pi * offset[2],
-        ))
-        return rotation
-
-    def try_get_euler(self, quart_rotation, offset: [], prev_rot_idx: int):
-        try:
-            m_rot = m_V.to_euler(
-                quart_rotation,
-
-                Euler((
-                    self.prev_rotation[prev_rot_idx][0] - pi * offset[0],
-                    self.prev_rotation[prev_rot_idx][1] - pi * offset[1],
-                    self.prev_rotation[prev_rot_idx][2] - pi * offset[2],
-                ))
-            )
-        except KeyError:
-            m_rot = m_V.to_euler(quart_rotation)
-            print(f"invalid id to euler combat {m_rot}, {self.frame}")
-
-        return m_rot
-
     # endregion
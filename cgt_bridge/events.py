@@ -1,27 +1,96 @@
 from __future__ import annotations
 
-from . import observer_pattern as op
+import time
 from typing import List
+
+from . import observer_pattern as op, payload
+from ..cgt_utils import filters
+from ..cgt_utils.profiler import profiler
 # from cgt_utils import log
 
 
-class UpdateListener(op.Listener):
-    """ Listens to updates of mp-ml tracking data and notifies receivers. """
-    _observers: List[op.Observer] = []
-    data = None
-    frame = 0
+class Subscription:
+    """ Observer subscribed to topics of a listener, all topics if None.
+    With a rate, updates within the interval after the last delivered update get skipped. """
+    def __init__(self, observer: op.Observer, topics: tuple = None, rate: float = 0.0):
+        self.observer = observer
+        self.topics = None if topics is None else frozenset(topics)
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.delivered = float('-inf')
+
+    def accepts(self, topics, now: float):
+        if self.topics is not None and topics is not None and self.topics.isdisjoint(topics):
+            return False
+        return now - self.delivered >= self.interval
 
-    def attach(self, observer: op.Observer) -> None:
+
+class UpdateListener(op.Listener):
+    """ Listens to updates of mp-ml tracking data and notifies its subscribed observers.
+    Updates carry the detected parts by topic, observers only receive updates containing a topic they subscribed to.
+    The meta topic is part of every update, updates with unknown topics reach every observer. """
+    def __init__(self):
+        self.subscriptions: List[Subscription] = []
+        self.data = None
+        self.frame = 0
+        # capture time of the frame in seconds, None if unknown
+        self.timestamp = None
+        # detected parts by topic, see payload.topics
+        self.topics = None
+
+    def attach(self, observer: op.Observer, topics: tuple = None, rate: float = 0.0) -> None:
+        """ subscribes the observer to the topics, rate limits the updates per second if set. """
+        unknown = set(topics or ()) - set(payload.TOPICS)
+        if unknown:
+            raise ValueError(f"Unknown topics: {unknown}")
         print("OBSERVER ATTACHED FROM UPDATE LISTENER")
-        self._observers.append(observer)
+        self.subscriptions.append(Subscription(observer, topics, rate))
 
     def detach(self, observer: op.Observer) -> None:
         print("OBSERVER DETACHED FROM UPDATE LISTENER")
-        self._observers.remove(observer)
+        self.subscriptions = [s for s in self.subscriptions if s.observer is not observer]
 
     def notify(self) -> None:
-        for observer in self._observers:
-            observer.update(self)
+        topics = None if self.topics is None else {"meta", *self.topics}
+        now = time.perf_counter()
+        for subscription in self.subscriptions:
+            if subscription.accepts(topics, now):
+                subscription.delivered = now
+                subscription.observer.update(self)
+
+
+class TimestampClock:
+    """ Places updates at their capture time in scene frames and subframes instead of every key step.
+    The origin timestamp lands at frame start, it defaults to the first received timestamp.
+    With a step, frames get rounded to the key grid of every step frames. """
+    def __init__(self, frame_start: float, fps: float, step: float = 0, origin: float = None):
+        self.frame_start = frame_start
+        self.fps = fps
+        self.step = step
+        self.origin = origin
+
+    def frame(self, subject: op.Listener):
+        if subject.timestamp is None:
+            return subject.frame
+        if self.origin is None:
+            self.origin = subject.timestamp
+
+        offset = (subject.timestamp - self.origin) * self.fps
+        if self.step > 0:
+            offset = round(offset / self.step) * self.step
+        return self.frame_start + offset
+
+
+def subject_frame(subject: op.Listener, clock: TimestampClock = None):
+    """ frame of the update, mapped from its capture time if there is a clock. """
+    return subject.frame if clock is None else clock.frame(subject)
+
+
+def subject_data(subject: op.Listener, model):
+    """ data of the update in the format of the models solution.
+    updates with topics provide only the parts the model consumes, f.e. the hands of holistic results. """
+    if subject.topics is None or model.solution is None:
+        return subject.data
+    return payload.from_topics(model.solution, subject.topics)
 
 
 class PrintRawDataUpdate(op.Observer):
@@ -36,30 +105,96 @@ class DriverDebug(op.Observer):
         self.model = _model
 
     def update(self, subject: op.Listener) -> None:
-        self.model.data = subject.data
+        self.model.data = subject_data(subject, self.model)
         self.model.frame = subject.frame
         self.model.init_data()
 
 
 class BpyUpdateReceiver(op.Observer):
-    """ Updates empties in realtime via modal operator. """
-    def __init__(self, _model):
+    """ Updates empties in realtime via modal operator.
+    The empties follow every update, their keyframes get written in bulk every flush interval updates.
+    Dead bands per data path skip keys of channels which stay still. """
+    def __init__(self, _model, flush_interval: int = 24, dead_bands: dict = None, clock: TimestampClock = None):
         self.model = _model
+        self.model.preview = True
+        if dead_bands is not None:
+            self.model.keyframes.dead_bands = dead_bands
         self.model.init_references()
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.updates = 0
+        # measures bridging and keying separately, f.e. for the rate governor
+        self.stage_timer = None
+        name = type(_model).__name__
+        self.stages = f"{name}.init_data", f"{name}.update", f"{name}.keyframes"
 
     def update(self, subject: op.Listener) -> None:
-        self.model.data = subject.data
-        self.model.frame = subject.frame
+        start = profiler.start()
+        self.model.data = subject_data(subject, self.model)
+        self.model.frame = subject_frame(subject, self.clock)
         self.model.init_data()
+        start = profiler.lap(self.stages[0], start)
         self.model.update()
+        start = profiler.lap(self.stages[1], start)
+
+        self.updates += 1
+        if self.updates % self.flush_interval == 0:
+            if self.stage_timer is not None:
+                self.stage_timer.mark('bridge')
+            self.model.keyframes.flush()
+            profiler.lap(self.stages[2], start)
+            if self.stage_timer is not None:
+                self.stage_timer.mark('keying')
+
+    def flush(self) -> None:
+        start = profiler.start()
+        self.model.keyframes.flush()
+        profiler.lap(self.stages[2], start)
+
+
+class BatchUpdateReceiver(op.Observer):
+    """ Stacks updates while detecting and applies them at once when flushed. """
+    def __init__(self, _model, clock: TimestampClock = None):
+        self.model = _model
+        self.model.init_references()
+        self.clock = clock
+        self.stack = []
+
+    def update(self, subject: op.Listener) -> None:
+        self.stack.append((subject_frame(subject, self.clock), subject_data(subject, self.model)))
+
+    def flush(self) -> None:
+        for frame, data in self.stack:
+            self.model.data = data
+            self.model.frame = frame
+            self.model.init_data()
+            self.model.update()
+        self.stack.clear()
+        self.model.keyframes.flush()
 
 
 class MemoryUpdateReceiver(op.Observer):
-    """ Preserve changes in memory for async update. """
-    def __init__(self, _hand):
-        self.hand = _hand
-        self.idx = 0
+    """ Records raw landmarks in memory without bpy work while detecting,
+    the bridge derives and keyframes the whole take when flushed.
+    The take may get smoothed and resampled to every resample step frames before. """
+    def __init__(self, _model, smooth_window: int = 0, resample_step: float = 0, clock: TimestampClock = None):
+        self.model = _model
+        self.model.init_references()
+        self.smooth_window = smooth_window
+        self.resample_step = resample_step
+        self.clock = clock
 
     def update(self, subject: op.Listener) -> None:
-        self.idx += 1
-        self.hand.allocate_memory(self.idx, subject.data)
+        self.model.allocate_memory(subject_frame(subject, self.clock), subject_data(subject, self.model))
+
+    def process_take(self, frames, landmarks):
+        if self.smooth_window > 2:
+            landmarks = filters.savgol_smooth(landmarks, self.smooth_window, breaks=filters.take_breaks(frames))
+        if self.resample_step > 0:
+            frames, landmarks = filters.resample_take(frames, landmarks, self.resample_step)
+        return frames, landmarks
+
+    def flush(self) -> None:
+        start = profiler.start()
+        self.model.bake(self.process_take)
+        profiler.lap(f"{type(self.model).__name__}.bake", start)
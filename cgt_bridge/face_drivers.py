@@ -1,14 +1,27 @@
+import time
+
 import numpy as np
-from mathutils import Euler
 
-from . import abs_assignment
+from . import abs_assignment, payload
 from ..cgt_blender.utils import objects
 from ..cgt_naming import FACE, COLLECTIONS
-from ..cgt_utils import m_V
+from ..cgt_utils import m_V, euler_continuity
 
 
 class BridgeFace(abs_assignment.DataAssignment):
+    solution = payload.FACE
+    # landmark pairs measured for the scale drivers, lengths get scaled by the eye distance
+    scale_pairs = np.array([
+        [362, 263],  # eye distance as avg scale
+        [62, 292], [13, 14],  # mouth width, height
+        [386, 374], [159, 145],  # left, right eye
+        [285, 388], [295, 297], [282, 332],  # left eyebrow in, mid, out
+        [55, 109], [65, 67], [52, 103],  # right eyebrow in, mid, out
+    ])
+    temple_points = [447, 366, 137, 227]  # temple.R, temple.L
+
     def __init__(self):
+        super().__init__()
         self.face = []
 
         self._mouth_driver = abs_assignment.CustomData()
@@ -17,6 +30,8 @@ class BridgeFace(abs_assignment.DataAssignment):
         self.eyebrow_L, self.eyebrow_R = abs_assignment.CustomData(), abs_assignment.CustomData()
 
         self.rotation_data, self.driver_scale_data = None, None
+        # head rotation continuing the previous frame
+        self.head_continuity = euler_continuity.EulerContinuity(1, 'XZY')
 
         self.col_name = COLLECTIONS.face
 
@@ -77,14 +92,28 @@ class BridgeFace(abs_assignment.DataAssignment):
         except IndexError:
             print("VALUE ERROR WHILE ASSIGNING FACE POSITION")
 
+    def memory_landmarks(self, data):
+        return data[0][:468]
+
+    def bake_memory(self, frames, landmarks):
+        """ positions, driver scales and rotations get derived for the whole take at once. """
+        data, pivots = self.landmark_origin(landmarks)
+        self.keyframe_take(self.face, frames, data, "location")
+
+        drivers = [self._mouth_driver.idx, self.eye_driver_L.idx, self.eye_driver_R.idx,
+                   self.eyebrow_L.idx, self.eyebrow_R.idx]
+        self.keyframe_take(self.face, frames, self.driver_scale_values(data), "scale", drivers)
+
+        rotations = np.zeros((len(frames), 2, 3), dtype=np.float32)
+        rotations[:, 0] = euler_continuity.unwrap_take(self.head_quaternions(data)[:, np.newaxis], 'XZY')[:, 0]
+        rotations[:, 1, 0] = self.chin_angles(data)
+        self.keyframe_take(self.face, frames, rotations, "rotation_euler", [self.pivot.idx, self.chin_driver.idx])
+
     # region length between objects as scale to drivers
     def set_scale_driver_data(self):
-        """ prepares mouth and eye driver data. """
-        # setting up drivers
-        avg_scale = m_V.vector_length_2d(self.data[362][1], self.data[263][1], 'Z')  # eye dist as avg scale
-        self.mouth_driver(avg_scale)
-        self.eye_driver(avg_scale)
-        self.eyebrow_drivers(avg_scale)
+        """ prepares mouth, eye and eyebrow driver data. """
+        (self._mouth_driver.sca, self.eye_driver_L.sca, self.eye_driver_R.sca,
+         self.eyebrow_L.sca, self.eyebrow_R.sca) = self.driver_scale_values(self.data)
 
         # prep data
         self.driver_scale_data = [
@@ -95,94 +124,90 @@ class BridgeFace(abs_assignment.DataAssignment):
             [self.eyebrow_R.idx, self.eyebrow_R.sca]
         ]
 
-    def mouth_driver(self, avg_scale):
-        """ get mouth driver scale data. """
-        mouth_w = self.average_length_at_scale(62, 292, avg_scale)  # mouth width
-        mouth_h = self.average_length_at_scale(13, 14, avg_scale)  # mouth height
-        self._mouth_driver.sca = [mouth_w, 0.001, mouth_h]
-
-    def eye_driver(self, avg_scale):
-        """ get eye driver scale data. """
-        eye_l = self.average_length_at_scale(386, 374, avg_scale)  # left eye
-        eye_r = self.average_length_at_scale(159, 145, avg_scale)  # right eye
-
-        self.eye_driver_L.sca = [1.5, 0.001, eye_l]
-        self.eye_driver_R.sca = [1.5, 0.001, eye_r]
-
-    def eyebrow_drivers(self, avg_scale):
-        eyebrow_in_l = self.average_length_at_scale(285, 388, avg_scale)
-        eyebrow_mid_l = self.average_length_at_scale(295, 297, avg_scale)
-        eyebrow_out_l = self.average_length_at_scale(282, 332, avg_scale)
-
-        eyebrow_in_r = self.average_length_at_scale(55, 109, avg_scale)
-        eyebrow_mid_r = self.average_length_at_scale(65, 67, avg_scale)
-        eyebrow_out_r = self.average_length_at_scale(52, 103, avg_scale)
-
-        self.eyebrow_L.sca = [eyebrow_in_l, eyebrow_mid_l, eyebrow_out_l]
-        self.eyebrow_R.sca = [eyebrow_in_r, eyebrow_mid_r, eyebrow_out_r]
-
-    # endregion
+    @classmethod
+    def driver_scale_values(cls, data):
+        """ returns mouth, eye and eyebrow driver scales (..., 5, 3) of landmarks (..., 468, 3).
+        all pairs are measured at once, lengths are 3d like the previous per pair implementation. """
+        vectors = data[..., cls.scale_pairs[:, 1], :] - data[..., cls.scale_pairs[:, 0], :]
+        lengths = np.sqrt(np.einsum('...ij,...ij->...i', vectors, vectors))
+        lengths = lengths[..., 1:] / lengths[..., :1]
+
+        # mouth, eye.L, eye.R: [width, depth, height], eyebrows: in, mid, out
+        sca = np.empty((*lengths.shape[:-1], 5, 3), dtype=np.float32)
+        sca[..., :3, 1] = 0.001
+        sca[..., 0, 0], sca[..., 0, 2] = lengths[..., 0], lengths[..., 1]
+        sca[..., 1:3, 0] = 1.5
+        sca[..., 1:3, 2] = lengths[..., 2:4]
+        sca[..., 3:, :] = lengths[..., 4:].reshape((*lengths.shape[:-1], 2, 3))
+        return sca
 
     def set_rotation_driver_data(self):
-        self.face_mesh_rotation()
-        self.chin_rotation()
-
-        head_rotation = self.quart_to_euler_combat(self.pivot.rot, self.pivot.idx, axis='XZY')
-        chin_rotation = self.chin_driver.rot
+        self.pivot.rot = self.head_quaternions(self.data)
+        head_rotation = self.head_continuity(self.pivot.rot[np.newaxis])[0]
+        self.chin_driver.rot = [self.chin_angles(self.data), 0, 0]
 
         self.rotation_data = [
             [self.pivot.idx, head_rotation],
-            [self.chin_driver.idx, chin_rotation]
+            [self.chin_driver.idx, self.chin_driver.rot]
         ]
 
-    def chin_rotation(self):
-        nose_dir = m_V.to_vector(self.data[168][1], self.data[2][1])
-        chin_dir = m_V.to_vector(self.data[168][1], self.data[200][1])
-        nose_dir_z, chin_dir_z = m_V.null_axis([nose_dir, chin_dir], 'X')
-        nose_dir_x, chin_dir_x = m_V.null_axis([nose_dir, chin_dir], 'Z')
-
-        z_angle = m_V.angle_between(nose_dir_z, chin_dir_z) * 1.8
-
-        chin_rotation = m_V.rotate_towards(self.data[152][1], self.data[6][1], 'Y', 'Z')
+    @staticmethod
+    def chin_angles(data):
+        """ x rotation (...) of the chin driver of landmarks (..., 468, 3),
+        based on the angle between nose and chin directions on the yz plane. """
+        yz_angle = m_V.segment_angles(data[..., 1:], np.array([[168, 2]]), np.array([[168, 200]]))[..., 0]
         # due to the base angle it's required to offset the rotation
-        self.chin_driver.rot = Euler(((z_angle - 3.14159 * .07) * 1.175, 0, 0))
+        return (yz_angle * 1.8 - 3.14159 * .07) * 1.175
 
-    def face_mesh_rotation(self):
-        """ calculate face quaternion using
+    @staticmethod
+    def head_quaternions(data):
+        """ calculate face quaternions (..., 4) of landmarks (..., 468, 3) using
         points to approximate the transformation matrix. """
-        origin = np.array([0, 0, 0])
         # TODO: fix rotation (flip z & y)
-
-        forward_point = m_V.center_point(np.array(self.data[1][1]), np.array(self.data[4][1]))  # nose
-        right_point = m_V.center_point(np.array(self.data[447][1]), np.array(self.data[366][1]))  # temple.R
-        down_point = np.array(self.data[152][1])  # chin
+        forward_point = m_V.center_point(data[..., 1, :], data[..., 4, :])  # nose
+        right_point = m_V.center_point(data[..., 447, :], data[..., 366, :])  # temple.R
+        down_point = data[..., 152, :]  # chin
 
         # direction vectors from imaginary origin
-        normal = m_V.normalize(m_V.to_vector(origin, forward_point))
-        tangent = m_V.normalize(m_V.to_vector(origin, right_point))
-        binormal = m_V.normalize(m_V.to_vector(origin, down_point))
+        normal, tangent, binormal = [
+            point / np.linalg.norm(point, axis=-1, keepdims=True) for point in [forward_point, right_point, down_point]]
 
         # generate matrix to decompose it and access quaternion rotation
-        matrix = m_V.generate_matrix(tangent, normal, binormal)
+        matrix = m_V.np_generate_matrix(tangent, normal, binormal)
         loc, quart, scale = m_V.decompose_matrix(matrix)
-
-        self.pivot.rot = quart
+        return quart
 
     # region cgt_utils
-    def average_length_at_scale(self, p1, p2, scale):
-        """ get length of 2d vector and normalize by 1d scale """
-        length = m_V.vector_length_2d(self.data[p1][1], self.data[p2][1], 'Z')
-        return m_V.vector_length(length / scale)
-
     def custom_landmark_origin(self):
         """ setting face mesh position to approximate origin """
-        self.data = [[idx, [-lmrk[0], lmrk[2], -lmrk[1]]] for idx, lmrk in self.data[:468]]
-        self.approximate_pivot_location()
-        self.data = [[idx, np.array(lmrk) - np.array(self.pivot.loc)] for idx, lmrk in self.data[:468]]
-
-    def approximate_pivot_location(self):
-        """ approximate origin based on canonical face mesh geometry """
-        right = m_V.center_point(np.array(self.data[447][1]), np.array(self.data[366][1]))  # temple.R
-        left = m_V.center_point(np.array(self.data[137][1]), np.array(self.data[227][1]))  # temple.L
-        self.pivot.loc = m_V.center_point(right, left)  # approximate origin
+        self.data, self.pivot.loc = self.landmark_origin(self.data)
+
+    @classmethod
+    def landmark_origin(cls, landmarks):
+        """ returns landmarks (..., 468, 3) relative to the approximate origin and the origin.
+        the origin is approximated based on canonical face mesh geometry. """
+        data = landmarks[..., :468, :][..., [0, 2, 1]] * np.array([-1, 1, -1], dtype=np.float32)
+        pivot = data[..., cls.temple_points, :].mean(axis=-2)  # center of the temples
+        data -= pivot[..., np.newaxis, :]
+        return data, pivot
     # endregion
+
+
+# region manual tests
+def init_data_benchmark(frames: int = 2000):
+    """ frames per second of preparing face data, doesn't require driver objects. """
+    bridge = BridgeFace()
+    landmarks = np.random.default_rng(0).random((frames, 478, 3), dtype=np.float32)
+
+    start = time.perf_counter()
+    for landmark in landmarks:
+        bridge.data = [landmark]
+        bridge.init_data()
+    fps = frames / (time.perf_counter() - start)
+    print(f"FACE INIT DATA: {fps:.0f} fps")
+    return fps
+
+
+if __name__ == '__main__':
+    init_data_benchmark()
+# endregion
@@ -0,0 +1,172 @@
+import json
+import socket
+import struct
+import time
+import zlib
+
+import numpy as np
+
+
+# binary frame format to stream landmarks between processes, every message is a fixed size header
+# [magic, version, solution type, flags, landmark rows, frame id, timestamp, meta, payload size]
+# followed by the landmark payload
+MAGIC = b'CGT'
+VERSION = 1
+HEADER = struct.Struct('<3sBBBHqdII')
+
+# flags
+FLOAT16 = 1  # payload is float16 instead of float32
+DELTA = 2  # payload is the difference to the previous frame of the solution
+COMPRESSED = 4  # payload is zlib compressed
+
+# bytes compression may add to a payload
+COMPRESSION_OVERHEAD = 64
+
+
+class FrameEncoder:
+    """ Encodes landmark frames of a solution into messages.
+    Deltas refer to the decoders reconstruction of the previous frame, so quantization errors don't add up.
+    Frames get fully encoded in the keyframe interval or if the landmarks don't match the previous frame. """
+    def __init__(self, solution: int, half: bool = True, delta: bool = False, compress: bool = False,
+                 keyframe_interval: int = 30):
+        self.solution = solution
+        self.half, self.delta, self.compress = half, delta, compress
+        self.keyframe_interval = keyframe_interval
+        self.reference, self.deltas = None, 0
+
+    def use_delta(self, landmarks: np.ndarray):
+        if not self.delta or self.reference is None or self.deltas >= self.keyframe_interval:
+            return False
+        if self.reference.shape != landmarks.shape:
+            return False
+        # nan marks missing landmarks which can't be restored from a difference
+        return np.array_equal(np.isnan(self.reference), np.isnan(landmarks))
+
+    def encode(self, frame: int, landmarks: np.ndarray, meta: int = 0, timestamp: float = 0.0):
+        landmarks = np.asarray(landmarks, dtype=np.float32)
+        flags = FLOAT16 if self.half else 0
+
+        values = landmarks
+        if self.use_delta(landmarks):
+            values = landmarks - self.reference
+            flags |= DELTA
+        encoded = values.astype(np.float16 if self.half else np.float32)
+
+        if self.delta:
+            decoded = encoded.astype(np.float32)
+            if flags & DELTA:
+                self.reference += decoded
+                self.deltas += 1
+            else:
+                self.reference, self.deltas = decoded, 0
+
+        payload = encoded.tobytes()
+        if self.compress:
+            payload = zlib.compress(payload, 1)
+            flags |= COMPRESSED
+
+        header = HEADER.pack(MAGIC, VERSION, self.solution, flags, len(landmarks), frame, timestamp, meta, len(payload))
+        return header + payload
+
+
+class FrameDecoder:
+    """ Decodes messages from a byte stream, incomplete messages stay buffered till more data has been fed.
+    Delta frames get restored from the previous frame of the same solution. """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.references = {}
+
+    def feed(self, data: bytes):
+        self.buffer += data
+
+    def frames(self):
+        """ yields complete messages as [solution, frame, timestamp, landmarks, meta]. """
+        while len(self.buffer) >= HEADER.size:
+            header = HEADER.unpack_from(self.buffer)
+            # reject foreign streams before buffering their payload
+            self.validate(header)
+            end = HEADER.size + header[-1]
+            if len(self.buffer) < end:
+                return
+
+            payload = bytes(self.buffer[HEADER.size:end])
+            del self.buffer[:end]
+            yield self.decode(header, payload)
+
+    @staticmethod
+    def validate(header: tuple):
+        """ raises a ValueError if the header isn't a supported message or declares more payload than its landmarks. """
+        magic, version, solution, flags, rows, frame, timestamp, meta, size = header
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unsupported frame format: {magic} version {version}")
+        if size > rows * 3 * 4 + COMPRESSION_OVERHEAD:
+            raise ValueError(f"Payload of {size} bytes exceeds {rows} landmarks")
+
+    def decode(self, header: tuple, payload: bytes):
+        magic, version, solution, flags, rows, frame, timestamp, meta, _ = header
+        self.validate(header)
+
+        if flags & COMPRESSED:
+            payload = zlib.decompress(payload)
+        dtype = np.float16 if flags & FLOAT16 else np.float32
+        landmarks = np.frombuffer(payload, dtype=dtype).reshape(rows, 3).astype(np.float32)
+
+        if flags & DELTA:
+            landmarks += self.references[solution]
+        self.references[solution] = landmarks
+        return [solution, frame, timestamp, landmarks.copy(), meta]
+
+
+def socket_address(address: str):
+    """ returns the socket family and address of 'host:port' or a unix socket path. """
+    if ':' in address or not hasattr(socket, 'AF_UNIX'):
+        host, port = address.rsplit(':', 1)
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    return socket.AF_UNIX, address
+
+
+# region manual tests
+def encoding_benchmark(frames: int = 600, rows: int = 478):
+    """ bytes per frame, encode and decode time of a face like random walk compared to json. """
+    rng = np.random.default_rng(0)
+    landmarks = np.cumsum(rng.normal(0, 0.001, (frames, rows, 3)), axis=0).astype(np.float32) + rng.random((rows, 3))
+
+    def json_variant():
+        start = time.perf_counter()
+        messages = [json.dumps({"frame": i, "landmarks": frame.tolist()}).encode() for i, frame in enumerate(landmarks)]
+        encoding = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = [np.array(json.loads(message)["landmarks"], dtype=np.float32) for message in messages]
+        decoding = time.perf_counter() - start
+        return messages, decoded, encoding, decoding
+
+    def binary_variant(**kwargs):
+        encoder, decoder = FrameEncoder(1, **kwargs), FrameDecoder()
+        start = time.perf_counter()
+        messages = [encoder.encode(i, frame) for i, frame in enumerate(landmarks)]
+        encoding = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = [decoder.decode(HEADER.unpack_from(m), m[HEADER.size:])[3] for m in messages]
+        decoding = time.perf_counter() - start
+        return messages, decoded, encoding, decoding
+
+    variants = {
+        "json": json_variant,
+        "float32": lambda: binary_variant(half=False),
+        "float16": lambda: binary_variant(half=True),
+        "float16 delta": lambda: binary_variant(half=True, delta=True),
+        "float16 delta zlib": lambda: binary_variant(half=True, delta=True, compress=True),
+        "float32 delta zlib": lambda: binary_variant(half=False, delta=True, compress=True),
+    }
+
+    for name, variant in variants.items():
+        messages, decoded, encoding, decoding = variant()
+        size = sum(len(message) for message in messages) / frames
+        error = np.abs(np.array(decoded) - landmarks).max()
+        print(f"{name:>20}: {size:8.0f} bytes/frame, encode {encoding / frames * 1e6:7.1f} us, "
+              f"decode {decoding / frames * 1e6:7.1f} us, max error {error:.2e}")
+
+
+if __name__ == '__main__':
+    encoding_benchmark()
+# endregion
@@ -1,13 +1,13 @@
 import numpy as np
-from mathutils import Euler
 
-from . import abs_assignment
+from . import abs_assignment, payload
 from ..cgt_naming import HAND, COLLECTIONS
 from ..cgt_blender.utils import objects
-from ..cgt_utils import m_V
+from ..cgt_utils import m_V, euler_continuity
 
 
 class BridgeHand(abs_assignment.DataAssignment):
+    solution = payload.HAND
     references = {
         0:  HAND.wrist,
         1:  HAND.thumb_cmc,
@@ -31,25 +31,43 @@ class BridgeHand(abs_assignment.DataAssignment):
         19: HAND.pinky_dip,
         20: HAND.pinky_tip,
     }
-    fingers = [
-        [5, 9],  # index finger
-        [9, 13],  # middle finger
-        [13, 17],  # ring finger
-        [17, 21],  # pinky
-        [1, 5]  # thumb
-    ]
+    # [parent, joint, child] of finger joints, their flexion gets keyed as x rotation of the joint
+    flexion_joints = np.array([
+        [0, 5, 6], [5, 6, 7], [6, 7, 8],  # index finger
+        [0, 9, 10], [9, 10, 11], [10, 11, 12],  # middle finger
+        [0, 13, 14], [13, 14, 15], [14, 15, 16],  # ring finger
+        [0, 17, 18], [17, 18, 19], [18, 19, 20],  # pinky
+        [0, 1, 2], [1, 2, 3], [2, 3, 4]  # thumb
+    ])
+    # [[start, end], [start, end]] base segments of neighbouring fingers,
+    # their spread gets keyed as z rotation of the first fingers base
+    spread_joints = np.array([
+        [[5, 6], [9, 10]],  # index to middle finger
+        [[13, 14], [9, 10]],  # ring to middle finger
+        [[17, 18], [13, 14]],  # pinky to ring finger
+        [[1, 2], [5, 6]]  # thumb to index finger
+    ])
+    # key finger spreads additionally to their flexion
+    spread = False
+    # keyed rotations, the wrist holds the global hand rotation
+    rotation_joints = np.concatenate([[0], flexion_joints[:, 1]])
 
     # hands
     left_hand = []
     right_hand = []
 
-    #  position and joint angle
+    #  position and rotations (16, 3) of the rotation joints
     left_hand_data, right_hand_data = None, None
     left_angles, right_angles = None, None
 
     frame = 0
     col_name = COLLECTIONS.hands
 
+    def __init__(self):
+        super().__init__()
+        # global rotation of the left and right hand continuing the previous frame
+        self.hand_continuity = euler_continuity.EulerContinuity(2)
+
     def init_references(self):
         """ generate empty objects for mapping. """
         self.left_hand = objects.add_empties(self.references, 0.005, ".L")
@@ -59,32 +77,52 @@ class BridgeHand(abs_assignment.DataAssignment):
 
     def init_data(self):
         """ prepares data before setting """
-        self.left_hand_data, self.right_hand_data = self.landmarks_to_hands(list(zip(self.data[0], self.data[1])))
-        self.left_angles = self.finger_angles(self.left_hand_data)
-        self.right_angles = self.finger_angles(self.right_hand_data)
-
-        # updated angle to joint references before applying
-        self.left_angles = self.prepare_rotation_data(self.left_angles)
-        self.right_angles = self.prepare_rotation_data(self.right_angles)
-
-        # using bpy matrix
-        left_hand_rot = self.global_hand_rotation(self.left_hand_data, 0, "L")
-        if left_hand_rot != None:
-            self.left_angles.append(left_hand_rot)
-
-        right_hand_rot = self.global_hand_rotation(self.right_hand_data, 100, "R")  # offset for euler combat
-        if right_hand_rot != None:
-            self.right_angles.append(right_hand_rot)
+        self.left_hand_data, self.right_hand_data = self.landmarks_to_hands(self.data[0], self.data[1])
+        self.set_rotation_data()
+
+    def set_rotation_data(self):
+        """ joint angles and global rotation of the current hand data """
+        hands = np.full((2, 21, 3), np.nan, dtype=np.float32)
+        for side, hand in enumerate([self.left_hand_data, self.right_hand_data]):
+            if hand is not None:
+                hands[side] = hand
+
+        # both hands at once
+        hand_eulers = self.hand_continuity(self.hand_quaternions(hands))
+        left_angles, right_angles = self.hand_rotations(hands, hand_eulers)
+        self.left_angles = None if self.left_hand_data is None else left_angles
+        self.right_angles = None if self.right_hand_data is None else right_angles
 
     def update(self):
         """ applies gathered data to references """
         self.set_position()
         self.set_rotation()
 
+    def memory_landmarks(self, data):
+        """ raw landmarks of the left and right hand (2, 21, 3), missing hands as nan. """
+        hands = np.full((2, 21, 3), np.nan, dtype=np.float32)
+        for side, hand in enumerate(self.sort_hands(data[0], data[1])):
+            if hand is not None:
+                hands[side] = hand
+        return hands
+
+    def bake_memory(self, frames, landmarks):
+        """ positions and rotations get derived for the whole take at once. """
+        hands = self.set_global_origin(landmarks)
+        self.keyframe_take(self.left_hand, frames, hands[:, 0], "location")
+        self.keyframe_take(self.right_hand, frames, hands[:, 1], "location")
+
+        # missing hands result in nan rotations which don't get keyed
+        rotations = self.hand_rotations(hands, euler_continuity.unwrap_take(self.hand_quaternions(hands)))
+        self.keyframe_take(self.left_hand, frames, rotations[:, 0], "rotation_euler", self.rotation_joints)
+        self.keyframe_take(self.right_hand, frames, rotations[:, 1], "rotation_euler", self.rotation_joints)
+
     def set_position(self):
         """ keyframe the input data."""
         for hand in [[self.left_hand, self.left_hand_data],
                      [self.right_hand, self.right_hand_data]]:
+            if hand[1] is None:
+                continue
             try:
                 self.translate(hand[0], hand[1], self.frame)
             except IndexError:
@@ -92,105 +130,73 @@ class BridgeHand(abs_assignment.DataAssignment):
 
     def set_rotation(self):
         """ keyframe custom angle data """
-        # [hand drivers, hand angles, euler combat idx offset]
-        for hand in [[self.left_hand, self.left_angles, 0],
-                     [self.right_hand, self.right_angles, 100]]:
-            try:
-                self.euler_rotate(hand[0], hand[1], self.frame, hand[2])
-            except IndexError:
-                pass
-
-    def prepare_rotation_data(self, angle_data):
-        """ prepare data formatting for applying keyframe """
-        data = []
-        # check if contains agnles
-        if angle_data is None:
-            return data
-
-        # every angle targets a finger joint
-        for idx, angles in enumerate(angle_data):
-            if angles is None:
-                break
-
-            # finger start & end idx
-            mcp, tip = self.fingers[idx]
-            # iter over every finger joint
-            for angle_idx, finger_idx in enumerate(range(mcp, tip - 1)):
-                joint_angle = [finger_idx, Euler((angles[angle_idx], 0, 0))]
-                data.append(joint_angle)
-
-        return data
-
-    def finger_angles(self, hand):
-        """ get finger joint x-angles of target hand """
-        if hand == []:
-            return None
+        for hand, angles in [[self.left_hand, self.left_angles],
+                             [self.right_hand, self.right_angles]]:
+            if angles is not None:
+                self.keyframe(hand, angles, self.frame, "rotation_euler", self.rotation_joints)
+
+    def hand_rotations(self, hands, hand_eulers):
+        """ rotations (..., 16, 3) of the rotation joints of hands (..., 21, 3) and their global rotation (..., 3). """
+        return np.concatenate([hand_eulers[..., np.newaxis, :], self.finger_rotations(hands)], axis=-2)
+
+    def finger_rotations(self, hands):
+        """ euler rotations (..., 15, 3) of the flexion joints of hands (..., 21, 3) in one pass.
+        flexion is the x rotation, spreads are the z rotation of the finger bases if enabled.
+        missing hands as nan result in nan rotations. """
+        first, second = self.flexion_joints[:, :2], self.flexion_joints[:, 1:]
+        if self.spread:
+            first = np.concatenate([first, self.spread_joints[:, 0]])
+            second = np.concatenate([second, self.spread_joints[:, 1]])
+        angles = m_V.segment_angles(hands, first, second)
+
+        joint_count = len(self.flexion_joints)
+        rotations = np.zeros((*angles.shape[:-1], joint_count, 3), dtype=np.float32)
+        rotations[..., 0] = angles[..., :joint_count]
+        if self.spread:
+            bases = np.argmax(self.flexion_joints[:, 1] == self.spread_joints[:, :1, 0], axis=1)
+            rotations[..., bases, 2] = angles[..., joint_count:]
+        rotations[np.isnan(angles[..., :joint_count])] = np.nan
+        return rotations
 
-        # get all finger vertex positions and add the origin
-        origin = hand[0][1]  # [0, 0, 0]
-        fingers = [[hand[idx][1] for idx in range(finger[0], finger[1])] for finger in self.fingers]
-        fingers = [np.array([origin] + finger) for finger in fingers]  # add origin to finger
-
-        # setup joints to calc finger angles
-        joints = [[0, 1, 2], [1, 2, 3], [2, 3, 4]]
-        finger_angles = [m_V.joint_angles(finger, joints) for finger in fingers]
-        return finger_angles
-
-    def global_hand_rotation(self, hand, combat_idx_offset=0, orientation="R"):
-        """calculates approximate hand rotation. """
-        if hand == []:
-            return None
-
-        palm_center = m_V.center_point(hand[5][1], hand[17][1])
-
-        # generate triangle
-        vertices = np.array(
-            [hand[0][1],
-             hand[5][1],
-             hand[17][1]])
-        connections = np.array([[0, 1, 2]])
+    @staticmethod
+    def hand_quaternions(hands):
+        """ calculates approximate hand rotations (..., 4) of hands (..., 21, 3). """
+        palm_center = m_V.center_point(hands[..., 5, :], hands[..., 17, :])
 
         # normal from triangle
-        normal, norm = m_V.create_normal_array(vertices, connections)
-        normal = m_V.normalize(normal[0])
-
-        # origin to palm center
-        tangent = m_V.normalize(m_V.to_vector(
-            hand[0][1],
-            palm_center
-        ))
+        normal = np.cross(hands[..., 5, :] - hands[..., 0, :], hands[..., 17, :] - hands[..., 0, :])
 
-        # palm dir
-        binormal = m_V.normalize(m_V.to_vector(
-            palm_center,
-            hand[17][1]
-        ))
+        # origin to palm center and palm dir
+        tangent = palm_center - hands[..., 0, :]
+        binormal = hands[..., 17, :] - palm_center
+        normal, tangent, binormal = [
+            vector / np.linalg.norm(vector, axis=-1, keepdims=True) for vector in [normal, tangent, binormal]]
 
         # rotation from matrix
-        matrix = m_V.generate_matrix(normal, tangent, binormal)
+        matrix = m_V.np_generate_matrix(normal, tangent, binormal)
         loc, quart, sca = m_V.decompose_matrix(matrix)
+        return quart
 
-        offset = [0, 0, 0]
-        euler = self.try_get_euler(quart, offset, combat_idx_offset)
-        euler = self.offset_euler(euler, offset)
-
-        hand_rotation = ([0, euler])
-        return hand_rotation
-
-    def landmarks_to_hands(self, hand_data):
+    def landmarks_to_hands(self, hands, orientation):
         """ determines to which hand the landmark data belongs """
-        left_hand = [data[0] for data in hand_data if data[1][1] is False]
-        right_hand = [data[0] for data in hand_data if data[1][1] is True]
+        left_hand, right_hand = self.sort_hands(hands, orientation)
 
         left_hand = self.set_global_origin(left_hand)
         right_hand = self.set_global_origin(right_hand)
 
         return left_hand, right_hand
 
+    @staticmethod
+    def sort_hands(hands, orientation):
+        """ returns raw landmarks of the left and right hand, None if not detected """
+        left_hand = next((hand for hand, o in zip(hands, orientation) if o[1] is False), None)
+        right_hand = next((hand for hand, o in zip(hands, orientation) if o[1] is True), None)
+        return left_hand, right_hand
+
     @staticmethod
     def set_global_origin(data):
-        """ sets global origin of landmarks to wrist """
-        if len(data) > 0:
-            data = [[idx, np.array([-lmrk[0], lmrk[2], -lmrk[1]])] for idx, lmrk in data[0]]
-            data = [[idx, lmrk - data[0][1]] for idx, lmrk in data]
+        """ sets global origin of landmarks (..., 21, 3) to wrist """
+        if data is not None:
+            data = data[..., [0, 2, 1]] * np.array([-1, 1, -1], dtype=np.float32)
+            data = data - data[..., :1, :]
         return data
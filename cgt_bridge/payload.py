@@ -0,0 +1,100 @@
+import numpy as np
+
+
+# solution types and the max amount of landmark rows of their detection results
+HAND, FACE, POSE, HOLISTIC = 0, 1, 2, 3
+SOLUTIONS = {"HAND": HAND, "FACE": FACE, "POSE": POSE, "HOLISTIC": HOLISTIC}
+ROWS = {HAND: 42, FACE: 478, POSE: 33, HOLISTIC: 543}
+
+# holistic row ranges of face, pose, left hand and right hand
+HOLISTIC_PARTS = [[0, 468], [468, 501], [501, 522], [522, 543]]
+
+# parts of detection results listeners may subscribe to, meta is part of every update
+TOPICS = ("face", "pose", "left_hand", "right_hand", "meta")
+
+
+def pack(solution: int, data):
+    """ returns detection results as landmark rows (N, 3) float32 and meta data.
+    the meta data of hands flags the right hands bitwise, missing holistic parts are nan. """
+    if solution == HAND:
+        hands, orientation = data
+        if not hands:
+            return np.empty((0, 3), dtype=np.float32), 0
+        meta = sum(1 << idx for idx, is_right in (orientation or []) if is_right)
+        return np.concatenate(hands).astype(np.float32, copy=False), meta
+
+    if solution == FACE:
+        return np.asarray(data[0], dtype=np.float32), 0
+
+    if solution == POSE:
+        return np.asarray(data, dtype=np.float32), 0
+
+    if solution == HOLISTIC:
+        landmarks = np.full((ROWS[HOLISTIC], 3), np.nan, dtype=np.float32)
+        for (start, end), part in zip(HOLISTIC_PARTS, data):
+            if part is not None:
+                landmarks[start:end] = part[:end - start]
+        return landmarks, 0
+
+    raise ValueError(f"Unknown solution type: {solution}")
+
+
+def topics(solution: int, data):
+    """ returns the detected parts of detection results by topic. """
+    if solution == HAND:
+        # the hand detector labels hands uniquely, of hands sharing a label anyway the first one counts like in the bridge
+        hands, orientation = data
+        parts = {}
+        for hand, (_, is_right) in zip(hands, orientation or []):
+            parts.setdefault("right_hand" if is_right else "left_hand", hand)
+        return parts
+
+    if solution == FACE:
+        return {"face": data[0]} if len(data) > 0 else {}
+
+    if solution == POSE:
+        return {"pose": data}
+
+    if solution == HOLISTIC:
+        return {topic: part for topic, part in zip(["face", "pose", "left_hand", "right_hand"], data) if part is not None}
+
+    raise ValueError(f"Unknown solution type: {solution}")
+
+
+def from_topics(solution: int, parts: dict):
+    """ returns detected parts by topic in the format of the solutions detection results, the inverse of topics.
+    parts of other solutions get ignored, f.e. a hand bridge reads the hands of holistic results. """
+    if solution == HAND:
+        hands = [[parts[topic], topic == "right_hand"] for topic in ["left_hand", "right_hand"] if topic in parts]
+        return [hand for hand, _ in hands], [[idx, is_right] for idx, (_, is_right) in enumerate(hands)]
+
+    if solution == FACE:
+        return [parts["face"]] if "face" in parts else []
+
+    if solution == POSE:
+        return parts.get("pose")
+
+    if solution == HOLISTIC:
+        return [parts.get(topic) for topic in ["face", "pose", "left_hand", "right_hand"]]
+
+    raise ValueError(f"Unknown solution type: {solution}")
+
+
+def unpack(solution: int, landmarks: np.ndarray, meta: int = 0):
+    """ returns packed landmarks in the format of the detectors results. """
+    if solution == HAND:
+        hands = [landmarks[i:i + 21] for i in range(0, len(landmarks) - 20, 21)]
+        orientation = [[idx, bool(meta >> idx & 1)] for idx in range(len(hands))]
+        return hands, orientation
+
+    if solution == FACE:
+        return [landmarks]
+
+    if solution == POSE:
+        return landmarks
+
+    if solution == HOLISTIC:
+        parts = [landmarks[start:end] for start, end in HOLISTIC_PARTS]
+        return [None if np.isnan(part[0, 0]) else part for part in parts]
+
+    raise ValueError(f"Unknown solution type: {solution}")
@@ -1,14 +1,27 @@
 import numpy as np
-from mathutils import Euler
 
-from . import abs_assignment
+from . import abs_assignment, payload
 from ..cgt_naming import POSE, COLLECTIONS
 from ..cgt_blender.utils import objects
-from ..cgt_utils import m_V
+from ..cgt_utils import m_V, euler_continuity
 
 
 class BridgePose(abs_assignment.DataAssignment):
+    solution = payload.POSE
+    # [scaled landmark, segment start, segment end], 33: shoulder center, 34: hip center
+    chain_segments = np.array([
+        [11, 33, 11], [12, 33, 12],  # shoulder to arm
+        [13, 11, 13], [14, 12, 14],  # upper arm
+        [15, 13, 15], [16, 14, 16],  # forearm
+        [19, 15, 19], [20, 16, 20],  # wrist
+        [23, 34, 23], [24, 34, 24],  # hip to leg
+        [25, 23, 25], [26, 24, 26],  # upper leg
+        [27, 25, 27], [28, 26, 28],  # lower leg
+        [29, 27, 29], [30, 28, 30],  # foot
+    ])
+
     def __init__(self):
+        super().__init__()
         self.references = {
             # MEDIAPIPE DEFAULTS
             0:  POSE.nose,
@@ -76,11 +89,14 @@ class BridgePose(abs_assignment.DataAssignment):
 
         self.shoulder_center = abs_assignment.CustomData()
         self.hip_center = abs_assignment.CustomData()
+        # torso, shoulder and hip rotation continuing the previous frame
+        self.rotation_continuity = euler_continuity.EulerContinuity(3)
 
         self.pose = []
         self.col_name = COLLECTIONS.pose
         self.rotation_data = []
         self.scale_data = []
+        self.location_data = []
 
     def init_references(self):
         # default empties
@@ -96,6 +112,7 @@ class BridgePose(abs_assignment.DataAssignment):
     def init_data(self):
         self.rotation_data = []
         self.scale_data = []
+        self.location_data = []
         self.prepare_landmarks()
         self.shoulder_hip_location()
         self.shoulder_hip_rotation()
@@ -110,10 +127,30 @@ class BridgePose(abs_assignment.DataAssignment):
         """Keyframe the position of input data."""
         try:
             self.translate(self.pose, self.data, self.frame)
+            self.translate(self.pose, self.location_data, self.frame)
 
         except IndexError:
             print("VALUE ERROR WHILE ASSIGNING POSE POSITION")
 
+    def memory_landmarks(self, data):
+        return data
+
+    def bake_memory(self, frames, landmarks):
+        """ positions, scales and rotations get derived for the whole take at once. """
+        data = self.landmarks_to_origin(landmarks)
+        shoulder_centers = m_V.center_point(data[:, 11], data[:, 12])
+        hip_centers = m_V.center_point(data[:, 23], data[:, 24])
+        centers = np.stack([shoulder_centers, hip_centers], axis=1)
+
+        self.keyframe_take(self.pose, frames, data, "location")
+        self.keyframe_take(self.pose, frames, centers, "location", [self.shoulder_center.idx, self.hip_center.idx])
+        self.keyframe_take(self.pose, frames, self.chain_scales(data, shoulder_centers, hip_centers),
+                           "scale", self.chain_segments[:, 0])
+
+        eulers = euler_continuity.unwrap_take(self.rotation_quaternions(data))
+        self.keyframe_take(self.pose, frames, self.center_rotations(eulers), "rotation_euler",
+                           [self.shoulder_center.idx, self.hip_center.idx])
+
     def set_rotation(self):
         self.euler_rotate(self.pose, self.rotation_data, self.frame)
         pass
@@ -122,125 +159,60 @@ class BridgePose(abs_assignment.DataAssignment):
         self.scale(self.pose, self.scale_data, self.frame)
 
     def average_rig_scale(self):
-        self.arm_chain_lengths()
-        self.leg_chain_lengths()
-
-    def leg_chain_lengths(self):
-        """ every segment changes length individually during the tracking process """
-        # 23: left_hip, 25: left_knee, 29: left_heel, 27: left_ankle
-        left_hip_leg_length = m_V.get_vector_distance(self.hip_center.loc, self.data[23][1])
-        left_upper_leg_length = m_V.get_vector_distance(self.data[23][1], self.data[25][1])
-        left_lower_leg_length = m_V.get_vector_distance(self.data[25][1], self.data[27][1])
-        left_foot_length = m_V.get_vector_distance(self.data[27][1], self.data[29][1])
-
-        # 24: right_hip, 26: right_knee, 28: right_ankle, 30: right_heel
-        right_hip_leg_length = m_V.get_vector_distance(self.hip_center.loc, self.data[24][1])
-        right_upper_leg_length = m_V.get_vector_distance(self.data[24][1], self.data[26][1])
-        right_lower_leg_length = m_V.get_vector_distance(self.data[26][1], self.data[28][1])
-        right_foot_length = m_V.get_vector_distance(self.data[28][1], self.data[30][1])
-
-        data = [
-            [23, [1, 1, left_hip_leg_length]],
-            [24, [1, 1, right_hip_leg_length]],
-            [25, [1, 1, left_upper_leg_length]],
-            [26, [1, 1, right_upper_leg_length]],
-            [27, [1, 1, left_lower_leg_length]],
-            [28, [1, 1, right_lower_leg_length]],
-            [29, [1, 1, left_foot_length]],
-            [30, [1, 1, right_foot_length]]
-        ]
-
-        for d in data:
-            self.scale_data.append(d)
-
-    def arm_chain_lengths(self):
-        """ every segment changes length individually during the tracking process """
-
-        # 11: left_shoulder, 13: left_elbow, 15: left_wrist, 19: left_index
-        right_shoulder_arm_length = m_V.get_vector_distance(self.shoulder_center.loc, self.data[12][1])
-        right_upper_arm_length = m_V.get_vector_distance(self.data[12][1], self.data[14][1])
-        right_forearm_length = m_V.get_vector_distance(self.data[14][1], self.data[16][1])
-        right_wrist_length = m_V.get_vector_distance(self.data[16][1], self.data[20][1])
-
-        # 12: right_shoulder, 14: right_elbow, 16: right_wrist, 20: right_index
-        left_shoulder_arm_length = m_V.get_vector_distance(self.shoulder_center.loc, self.data[11][1])
-        left_upper_arm_length = m_V.get_vector_distance(self.data[11][1], self.data[13][1])
-        left_forearm_length = m_V.get_vector_distance(self.data[13][1], self.data[15][1])
-        left_wrist_length = m_V.get_vector_distance(self.data[15][1], self.data[19][1])
-
-        data = [
-            [11, [1, 1, left_shoulder_arm_length]],
-            [12, [1, 1, right_shoulder_arm_length]],
-            [13, [1, 1, left_upper_arm_length]],
-            [14, [1, 1, right_upper_arm_length]],
-            [15, [1, 1, left_forearm_length]],
-            [16, [1, 1, right_forearm_length]],
-            [19, [1, 1, left_wrist_length]],
-            [20, [1, 1, right_wrist_length]]
-        ]
-
-        for d in data:
-            self.scale_data.append(d)
-
-    def torso_rotation(self):
+        for idx, sca in zip(self.chain_segments[:, 0], self.chain_scales(
+                self.data, self.shoulder_center.loc, self.hip_center.loc)):
+            self.scale_data.append([idx, sca])
+
+    @classmethod
+    def chain_scales(cls, data, shoulder_center, hip_center):
+        """ every segment changes length individually during the tracking process.
+        returns the scale (..., 16, 3) of the chain segments of landmarks (..., 33, 3). """
+        points = np.concatenate([data, shoulder_center[..., np.newaxis, :], hip_center[..., np.newaxis, :]], axis=-2)
+        vectors = points[..., cls.chain_segments[:, 2], :] - points[..., cls.chain_segments[:, 1], :]
+
+        sca = np.ones((*vectors.shape[:-1], 3), dtype=np.float32)
+        sca[..., 2] = np.sqrt(np.einsum('...ij,...ij->...i', vectors, vectors))
+        return sca
+
+    @staticmethod
+    def rotation_quaternions(data):
+        """ torso, shoulder and hip rotations (..., 3, 4) of landmarks (..., 33, 3). """
         # approximate perpendicular points to origin
-        hip_center = m_V.center_point(np.array(self.data[23][1]), np.array(self.data[24][1]))
-        right_hip = np.array(self.data[24][1])
-        shoulder_center = m_V.center_point(np.array(self.data[11][1]), np.array(self.data[12][1]))
-
-        # generate triangle
-        vertices = np.array(
-            [self.data[23][1],
-             self.data[24][1],
-             shoulder_center])
-        connections = np.array([[0, 1, 2]])
+        hip_center = m_V.center_point(data[..., 23, :], data[..., 24, :])
+        right_hip = data[..., 24, :]
+        shoulder_center = m_V.center_point(data[..., 11, :], data[..., 12, :])
 
         # get normal from triangle
-        normal, norm = m_V.create_normal_array(vertices, connections)
+        normal = np.cross(right_hip - data[..., 23, :], shoulder_center - data[..., 23, :])
 
         # direction vectors from imaginary origin
-        tangent = m_V.normalize(m_V.to_vector(hip_center, right_hip))
-        normal = m_V.normalize(normal[0])
-        binormal = m_V.normalize(m_V.to_vector(hip_center, shoulder_center))
+        tangent = m_V.to_vector(hip_center, right_hip)
+        binormal = m_V.to_vector(hip_center, shoulder_center)
+        tangent, normal, binormal = [
+            vector / np.linalg.norm(vector, axis=-1, keepdims=True) for vector in [tangent, normal, binormal]]
 
         # generate matrix to decompose it and access quaternion rotation
-        matrix = m_V.generate_matrix(tangent, binormal, normal)
-        loc, quart, scale = m_V.decompose_matrix(matrix)
-
-        offset = [-.5, 0, 0]
-        euler = self.try_get_euler(quart, offset, self.hip_center.idx)
-        euler = self.offset_euler(euler, offset)
-
-        return euler
-
-    def shoulder_rotation(self):
-        # rotation from shoulder center to shoulder.R
-        shoulder_center = m_V.center_point(self.data[11][1], self.data[12][1])
-        shoulder_rotation = m_V.rotate_towards(shoulder_center, self.data[12][1], 'Z')
-
-        # rotation from hip center to hip.R
-        hip_center = m_V.center_point(self.data[23][1], self.data[24][1])
-        hip_rotation = m_V.rotate_towards(hip_center, self.data[24][1], 'Z')
-
-        # chance to offset result / rotation may not be keyframed
-        offset = [0, 0, 0]
-        shoulder_euler = self.try_get_euler(shoulder_rotation, offset, 7)
-        shoulder_rot = self.offset_euler(shoulder_euler, offset)
-
-        hip_euler = self.try_get_euler(hip_rotation, offset, 8)
-        hip_rot = self.offset_euler(hip_euler, offset)
-
+        matrix = m_V.np_generate_matrix(tangent, binormal, normal)
+        loc, torso, scale = m_V.decompose_matrix(matrix)
+
+        # rotation from shoulder center to shoulder.R and from hip center to hip.R
+        shoulder = m_V.rotate_towards(shoulder_center, data[..., 12, :], 'Z')
+        hip = m_V.rotate_towards(hip_center, right_hip, 'Z')
+        return np.stack([torso, shoulder, hip], axis=-2)
+
+    @staticmethod
+    def center_rotations(eulers):
+        """ shoulder and hip center rotations (..., 2, 3) of torso, shoulder and hip eulers (..., 3, 3). """
+        torso, shoulder, hip = eulers[..., 0, :], eulers[..., 1, :], eulers[..., 2, :]
         # offset between hip & shoulder rot = real shoulder rot
-        euler = Euler((shoulder_rot[0] - hip_rot[0],
-                       shoulder_rot[1] - hip_rot[1],
-                       shoulder_rot[2] - hip_rot[2]))
-
-        return euler
+        shoulder_rot = shoulder - hip
+        hip_rot = torso + np.array([-.5 * np.pi, 0, 0], dtype=torso.dtype)
+        return np.stack([shoulder_rot, hip_rot], axis=-2)
 
     def shoulder_hip_rotation(self):
         """ Creates custom rotation data for driving the cgt_rig. """
-        self.shoulder_center.rot = self.shoulder_rotation()
-        self.hip_center.rot = self.torso_rotation()
+        eulers = self.rotation_continuity(self.rotation_quaternions(self.data))
+        self.shoulder_center.rot, self.hip_center.rot = self.center_rotations(eulers)
 
         # setup data format
         data = [
@@ -252,12 +224,17 @@ class BridgePose(abs_assignment.DataAssignment):
 
     def shoulder_hip_location(self):
         """ Appending custom location data for driving the cgt_rig. """
-        self.shoulder_center.loc = m_V.center_point(self.data[11][1], self.data[12][1])
-        self.data.append([self.shoulder_center.idx, self.shoulder_center.loc])
+        self.shoulder_center.loc = m_V.center_point(self.data[11], self.data[12])
+        self.location_data.append([self.shoulder_center.idx, self.shoulder_center.loc])
 
-        self.hip_center.loc = m_V.center_point(self.data[23][1], self.data[24][1])
-        self.data.append([self.hip_center.idx, self.hip_center.loc])
+        self.hip_center.loc = m_V.center_point(self.data[23], self.data[24])
+        self.location_data.append([self.hip_center.idx, self.hip_center.loc])
 
     def prepare_landmarks(self):
         """ setting face mesh position to approximate origin """
-        self.data = [[idx, np.array([-lmrk[0], lmrk[2], -lmrk[1]])] for idx, lmrk in self.data]
+        self.data = self.landmarks_to_origin(self.data)
+
+    @staticmethod
+    def landmarks_to_origin(data):
+        """ maps landmarks (..., 33, 3) to blenders axes """
+        return data[..., [0, 2, 1]] * np.array([-1, 1, -1], dtype=np.float32)
@@ -0,0 +1,53 @@
+import time
+
+from . import events, payload
+from ..cgt_utils import shared_ring
+
+
+class RingReceiver:
+    """ Drains the newest frames of a shared ring into an update listener.
+    Frames which got overwritten before they have been read count as dropped. """
+    def __init__(self, ring: shared_ring.SharedRing, solution: int, listener: events.UpdateListener):
+        self.ring = ring
+        self.solution = solution
+        self.listener = listener
+
+        # sequence of the last read frame
+        self.read_seq = 0
+        self.consumed, self.dropped = 0, 0
+        # publish to consume of the latest frame in seconds
+        self.latency = 0.0
+
+    def drain(self):
+        """ notifies the listener about every unread frame in the ring, returns the amount of frames. """
+        latest = self.ring.seq
+        if latest == self.read_seq:
+            return 0
+
+        # older frames have already been overwritten
+        first = max(self.read_seq + 1, latest - len(self.ring.slots) + 1)
+        self.dropped += first - self.read_seq - 1
+
+        received = 0
+        for seq in range(first, latest + 1):
+            frame = self.ring.read(seq)
+            if frame is None:
+                self.dropped += 1
+                continue
+
+            landmarks = frame['landmarks'][:frame['count']]
+            self.listener.data = payload.unpack(self.solution, landmarks, int(frame['meta']))
+            self.listener.topics = payload.topics(self.solution, self.listener.data)
+            self.listener.frame = int(frame['frame'])
+            self.listener.timestamp = float(frame['timestamp'])
+            self.listener.notify()
+            self.latency = time.perf_counter() - frame['published']
+            received += 1
+
+        self.read_seq = latest
+        self.consumed += received
+
+        self.ring.header['consumed'] = self.consumed
+        self.ring.header['dropped'] = self.dropped
+        self.ring.header['latency'] = self.latency
+        return received
@@ -0,0 +1,98 @@
+import os
+import socket
+import zlib
+
+from . import events, payload, frame_protocol
+
+
+class SocketReceiver:
+    """ Listens on a local socket for a detector streaming encoded frames.
+    Draining never blocks, frames of other solutions than the received one get ignored. """
+    def __init__(self, listener: events.UpdateListener, solution: int, address: str = "127.0.0.1:5005"):
+        self.listener = listener
+        self.solution = solution
+
+        family, self.address = frame_protocol.socket_address(address)
+        if family == socket.AF_INET:
+            self.server = socket.socket(family, socket.SOCK_STREAM)
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        else:
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            self.server = socket.socket(family, socket.SOCK_STREAM)
+        self.server.bind(self.address)
+        self.server.listen(1)
+        self.server.setblocking(False)
+
+        self.connection, self.decoder = None, None
+        self.consumed, self.ignored, self.received_bytes = 0, 0, 0
+
+    def accept(self):
+        try:
+            self.connection, _ = self.server.accept()
+        except BlockingIOError:
+            return False
+        self.connection.setblocking(False)
+        self.decoder = frame_protocol.FrameDecoder()
+        print("DETECTOR CONNECTED TO SOCKET RECEIVER")
+        return True
+
+    def drain(self):
+        """ notifies the listener about every completely received frame, returns the amount of frames. """
+        if self.connection is None and not self.accept():
+            return 0
+
+        while True:
+            try:
+                data = self.connection.recv(1 << 16)
+            except BlockingIOError:
+                break
+            except ConnectionError:
+                data = b''
+            if not data:
+                # the detector disconnected, frames left in the buffer still get applied
+                self.disconnect()
+                print("DETECTOR DISCONNECTED FROM SOCKET RECEIVER")
+                break
+            self.decoder.feed(data)
+            self.received_bytes += len(data)
+
+        received, frames = 0, self.decoder.frames()
+        while True:
+            try:
+                message = next(frames, None)
+                if message is None:
+                    break
+                solution, frame, timestamp, landmarks, meta = message
+                data = payload.unpack(solution, landmarks, meta) if solution == self.solution else None
+            except (ValueError, KeyError, zlib.error) as e:
+                # f.e. a foreign client or another protocol version, the next client starts with a new decoder
+                self.disconnect()
+                self.decoder = None
+                print(f"REJECTED SOCKET CLIENT: {e}")
+                break
+
+            if data is None:
+                self.ignored += 1
+                continue
+            # errors of the observers aren't the clients fault
+            self.listener.data = data
+            self.listener.topics = payload.topics(solution, data)
+            self.listener.frame = frame
+            self.listener.timestamp = timestamp
+            self.listener.notify()
+            received += 1
+
+        self.consumed += received
+        return received
+
+    def disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def close(self):
+        self.disconnect()
+        self.server.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
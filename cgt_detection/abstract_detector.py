@@ -1,42 +1,83 @@
+import time
 from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
 from mediapipe.framework.formats import classification_pb2
 from mediapipe import solutions
 
-from ..cgt_blender import input_manager
+from . import model_session
+from ..cgt_bridge import events, payload
+from ..cgt_utils import filters, stream
+from ..cgt_utils.profiler import profiler
 
 
 class RealtimeDetector(ABC):
     stream = None
     observer, listener, _timer = None, None, None
-    solution = None
+    solution, session = None, None
+    landmark_filter = None
     drawing_utils, drawing_style, = None, None
+    # measures the stages of detected frames, f.e. for the rate governor
+    stage_timer = None
+    # frames get downscaled before inference
+    input_scale = 1.0
 
     key_step = 4
     frame = None
+    # payload type of the detection results, determines their topics
+    payload_type = None
+    # topics the bridge observer consumes, all if None
+    topics = None
+    # bridge observers with their topics [[observer, topics], ...] if the results feed several bridges
+    observers = None
 
-    def __init__(self):
+    def __init__(self, frame_start: int = None, key_step: int = None):
         self.drawing_utils = solutions.drawing_utils
         self.drawing_style = solutions.drawing_styles
         # todo: state
-        self.frame = input_manager.get_frame_start()
-        self.key_step = input_manager.get_keyframe_step()
+        # detectors may run outside of blender (worker processes) when frame start and key step are set
+        if frame_start is None or key_step is None:
+            from ..cgt_blender import input_manager
+            frame_start = input_manager.get_frame_start() if frame_start is None else frame_start
+            key_step = input_manager.get_keyframe_step() if key_step is None else key_step
+        self.frame = frame_start
+        self.key_step = key_step
 
     @abstractmethod
-    def image_detection(self):
+    def init_bpy_bridge(self, receiver):
+        """ set the bridge observer, the receiver determines when data gets applied in blender. """
         pass
 
-    @abstractmethod
-    def init_bpy_bridge(self):
-        pass
+    def bridge_observers(self):
+        """ returns the bridge observers and the topics they consume [[observer, topics], ...]. """
+        if self.observers is not None:
+            return self.observers
+        return [[self.observer, self.topics]]
+
+    def attach_observer(self, rate: float = 0.0):
+        """ subscribes every bridge observer to the topics it consumes, rate limits its updates per second if set. """
+        for observer, topics in self.bridge_observers():
+            self.listener.attach(observer, topics, rate)
+
+    def flush_observers(self):
+        """ applies the data the bridge observers hold back. """
+        for observer, _ in self.bridge_observers():
+            observer.flush()
 
     @abstractmethod
     def initialize_model(self):
+        """ set the solution and open its model session. """
         pass
 
     @abstractmethod
     def process_detection_result(self, mp_res):
         pass
 
+    def filter_detection_result(self, data, timestamp):
+        """ smooths the processed landmarks using the landmark filter. """
+        return data
+
     @abstractmethod
     def contains_features(self, mp_res):
         pass
@@ -45,51 +86,131 @@ class RealtimeDetector(ABC):
     def draw_result(self, s, mp_res, mp_drawings):
         pass
 
+    def image_detection(self):
+        """ detects a single frame using the running model session. """
+        return self.exec_detection(self.session.mp_lib)
+
+    def stream_detection(self, callback=None):
+        """ detects till the stream ends, the callback receives the stream after every frame. """
+        while self.stream.capture.isOpened():
+            state = self.exec_detection(self.session.mp_lib)
+            if callback is not None:
+                callback(self.stream)
+            if state == {'CANCELLED'}:
+                return {'CANCELLED'}
+
+    def open_session(self, model, **kwargs):
+        """ builds the solution graph once, it's kept alive till the session gets closed. """
+        self.close_session()
+        self.session = model_session.ModelSession(model, **kwargs)
+        self.session.open()
+
+    def init_filter(self, reset_after: float = 0.5):
+        """ enables smoothing of the landmarks before listeners get notified. """
+        self.landmark_filter = filters.LandmarkFilters(reset_after)
+
+    def set_model_complexity(self, complexity: int):
+        """ reopens the session with the model complexity, solutions without complexity setting ignore it. """
+        if self.session is None or self.session.kwargs.get('model_complexity', complexity) == complexity:
+            return False
+        self.session.reopen(model_complexity=complexity)
+        return True
+
+    def mark_stage(self, stage: str):
+        if self.stage_timer is not None:
+            self.stage_timer.mark(stage)
+
+    def close_session(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
     def exec_detection(self, mp_lib):
+        if self.stage_timer is not None:
+            self.stage_timer.begin()
+        start = profiler.start()
         if not self.stream_updated():
+            if not self.stream.capture.isOpened():
+                # end of recorded footage
+                return {'CANCELLED'}
             return {'PASS_THROUGH'}
+        start = profiler.lap('capture', start)
+        self.mark_stage('capture')
 
         # detect features in frame
-        self.stream.frame.flags.writeable = False
-        self.stream.set_color_space('rgb')
-        mp_res = mp_lib.process(self.stream.frame)
-        self.stream.set_color_space('bgr')
+        frame = self.stream.convert()
+        if self.input_scale < 1.0:
+            # landmarks are normalized or in world space, so they don't depend on the input resolution
+            frame = cv2.resize(frame, None, fx=self.input_scale, fy=self.input_scale, interpolation=cv2.INTER_AREA)
+        start = profiler.lap('convert', start)
+        # passed by reference while not writeable
+        frame.flags.writeable = False
+        mp_res = mp_lib.process(frame)
+        frame.flags.writeable = True
+        start = profiler.lap('inference', start)
+        self.mark_stage('inference')
 
         # proceed if contains features
         if not self.contains_features(mp_res):
-            self.stream.draw()
-            if self.stream.exit_stream():
-                return {'CANCELLED'}
+            if self.stream.drawing:
+                self.stream.draw()
+                profiler.lap('preview', start)
+                if self.stream.exit_stream():
+                    return {'CANCELLED'}
+            self.end_stages()
             return {'PASS_THROUGH'}
 
-        # draw results
-        self.draw_result(self.stream, mp_res, self.drawing_utils)
-        self.stream.draw()
+        # draw results, without preview the operator cancels instead of polling keys in the window
+        if self.stream.drawing:
+            self.draw_result(self.stream, mp_res, self.drawing_utils)
+            start = profiler.lap('draw_landmarks', start)
+            self.stream.draw()
+            start = profiler.lap('preview', start)
+        self.mark_stage('preview')
 
         # update listeners
-        self.listener.data = self.process_detection_result(mp_res)
-        self.update_listeners()
+        data = self.process_detection_result(mp_res)
+        start = profiler.lap('landmark_array', start)
+        if self.landmark_filter is not None:
+            data = self.filter_detection_result(data, self.stream.timestamp)
+            start = profiler.lap('filter', start)
+        self.listener.data = data
+        self.update_listeners(self.stream.timestamp)
+        profiler.lap('bridge', start)
+        self.end_stages()
 
         # exit stream
-        if self.stream.exit_stream():
+        if self.stream.drawing and self.stream.exit_stream():
             return {'CANCELLED'}
         return {'PASS_THROUGH'}
 
+    def end_stages(self):
+        """ attributes the time since the last mark to the bridge and completes the measured frame. """
+        if self.stage_timer is not None:
+            self.stage_timer.mark('bridge')
+            self.stage_timer.end()
+
     def stream_updated(self):
+        # polls without a new frame are common for threaded webcams, they get counted instead of reported
         self.stream.update()
-        if not self.stream.updated:
-            print("Ignoring empty camera frame")
-            return False
-        return True
+        return bool(self.stream.updated)
 
-    def update_listeners(self):
+    def update_listeners(self, timestamp: float = None):
+        """ notifies the listeners, receivers may place the data at its capture timestamp instead of the frame. """
         self.frame += self.key_step
         self.listener.frame = self.frame
+        self.listener.timestamp = timestamp
+        if self.payload_type is not None:
+            self.listener.topics = payload.topics(self.payload_type, self.listener.data)
         self.listener.notify()
 
     def cvt2landmark_array(self, landmark_list):
-        """landmark_list: A normalized landmark list proto message to be annotated on the image."""
-        return [[idx, [landmark.x, landmark.y, landmark.z]] for idx, landmark in enumerate(landmark_list.landmark)]
+        """landmark_list: A normalized landmark list proto message to be annotated on the image.
+        returns a contiguous (N, 3) float32 array of the landmark locations. """
+        landmarks = landmark_list.landmark
+        return np.fromiter(
+            (axis for landmark in landmarks for axis in (landmark.x, landmark.y, landmark.z)),
+            dtype=np.float32, count=len(landmarks) * 3).reshape(-1, 3)
 
     def cvt_hand_orientation(self, orientation: classification_pb2):
         if not orientation:
@@ -98,7 +219,50 @@ class RealtimeDetector(ABC):
         return [[idx, "Right" in str(o)] for idx, o in enumerate(orientation)]
 
     def __del__(self):
-        self.listener.detach(self.observer)
-        del self.observer
+        self.close_session()
+        if self.stream is not None:
+            self.stream.release()
+        for observer, _ in self.bridge_observers():
+            self.listener.detach(observer)
+        self.observer, self.observers = None, None
         del self.listener
         del self.stream
+
+
+# region benchmark
+def init_benchmark(detector, clip_path: str):
+    """ returns a tracking handler detecting the clip without preview and observers, so only detection gets measured. """
+    tracking_handler = detector(frame_start=0, key_step=1)
+    tracking_handler.stream = stream.VideoFileSource(clip_path)
+    tracking_handler.stream.preview = False
+    tracking_handler.initialize_model()
+    tracking_handler.listener = events.UpdateListener()
+    return tracking_handler
+
+
+def per_frame_latency(tracking_handler, frames: int = 100):
+    """ compares rebuilding the graph every frame with the kept model session.
+    the handlers stream should be a video file source, so both runs process the same footage.
+    returns the median latency per frame in ms [rebuild, session]. """
+    session = tracking_handler.session
+
+    def rebuild():
+        with model_session.ModelSession(session.model, **session.kwargs) as mp_lib:
+            tracking_handler.exec_detection(mp_lib)
+
+    def keep():
+        tracking_handler.exec_detection(session.mp_lib)
+
+    latencies = []
+    for detection in [rebuild, keep]:
+        tracking_handler.stream.seek(0)
+        timings = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            detection()
+            timings.append(time.perf_counter() - start)
+        latencies.append(np.median(timings) * 1000)
+
+    print(f"PER FRAME LATENCY: rebuild {latencies[0]:.2f} ms, session {latencies[1]:.2f} ms")
+    return latencies
+# endregion
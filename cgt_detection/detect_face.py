@@ -1,38 +1,31 @@
 import mediapipe as mp
 
 from . import abstract_detector
-from ..cgt_bridge import events, face_drivers
+from ..cgt_bridge import events, payload
 from ..cgt_utils import stream
 
 
 class FaceDetector(abstract_detector.RealtimeDetector):
-    def image_detection(self):
-        with self.solution.FaceMesh(
-                static_image_mode=False,
-                refine_landmarks=True,
-                min_detection_confidence=0.7) as mp_lib:
-            return self.exec_detection(mp_lib)
-
-    def stream_detection(self):
-        with self.solution.FaceMesh(
-                min_detection_confidence=0.8,
-                min_tracking_confidence=0.5,
-                static_image_mode=False,
-        ) as mp_lib:
-            while self.stream.capture.isOpened():
-                state = self.exec_detection(mp_lib)
-                if state == {'CANCELLED'}:
-                    return {'CANCELLED'}
+    payload_type = payload.FACE
+    topics = ("face",)
 
     def initialize_model(self):
         self.solution = mp.solutions.face_mesh
-
-    def init_bpy_bridge(self):
+        self.open_session(
+            self.solution.FaceMesh,
+            min_detection_confidence=0.8,
+            min_tracking_confidence=0.5,
+            static_image_mode=False,
+            refine_landmarks=True)
+
+    def init_bpy_bridge(self, receiver=events.BpyUpdateReceiver):
+        from ..cgt_bridge import face_drivers
         target = face_drivers.BridgeFace()
-        self.observer = events.BpyUpdateReceiver(target)
+        self.observer = receiver(target)
         self.listener = events.UpdateListener()
 
     def init_driver_logs(self):
+        from ..cgt_bridge import face_drivers
         target = face_drivers.BridgeFace()
         self.observer = events.DriverDebug(target)
         self.listener = events.UpdateListener()
@@ -44,6 +37,9 @@ class FaceDetector(abstract_detector.RealtimeDetector):
     def process_detection_result(self, mp_res):
         return [self.cvt2landmark_array(landmark) for landmark in mp_res.multi_face_landmarks]
 
+    def filter_detection_result(self, data, timestamp):
+        return [self.landmark_filter(f"FACE.{idx}", face, timestamp) for idx, face in enumerate(data)]
+
     def contains_features(self, mp_res):
         if not mp_res.multi_face_landmarks:
             return False
@@ -72,14 +68,21 @@ def stream_detection(tracking_handler):
     tracking_handler.stream_detection()
 
 
-def init_test():
+def benchmark(clip_path):
+    """ per frame latency on a recorded clip. """
+    tracking_handler = abstract_detector.init_benchmark(FaceDetector, clip_path)
+    abstract_detector.per_frame_latency(tracking_handler)
+    del tracking_handler
+
+
+def init_test(camera_index=0):
     tracking_handler = FaceDetector()
 
-    tracking_handler.stream = stream.Webcam()
+    tracking_handler.stream = stream.Webcam(camera_index=camera_index)
     tracking_handler.initialize_model()
     # tracking_handler.init_driver_logs()
     tracking_handler.init_raw_data_printer()
-    tracking_handler.listener.attach(tracking_handler.observer)
+    tracking_handler.attach_observer()
     return tracking_handler
 
 
@@ -1,39 +1,31 @@
 import mediapipe as mp
 
 from . import abstract_detector
-from ..cgt_bridge import events, hand_drivers
+from ..cgt_bridge import events, payload
 from ..cgt_utils import stream
 
 
 class HandDetector(abstract_detector.RealtimeDetector):
-    def image_detection(self):
-        with self.solution.Hands(
-                static_image_mode=True,
-                max_num_hands=2,
-                min_detection_confidence=0.7) as mp_lib:
-            return self.exec_detection(mp_lib)
-
-    def stream_detection(self):
-        with self.solution.Hands(
-                min_detection_confidence=0.8,
-                min_tracking_confidence=0.5,
-                static_image_mode=False,
-                max_num_hands=2
-        ) as mp_lib:
-            while self.stream.capture.isOpened():
-                state = self.exec_detection(mp_lib)
-                if state == {'CANCELLED'}:
-                    return {'CANCELLED'}
+    payload_type = payload.HAND
+    topics = ("left_hand", "right_hand")
 
     def initialize_model(self):
         self.solution = mp.solutions.hands
-
-    def init_bpy_bridge(self):
+        self.open_session(
+            self.solution.Hands,
+            min_detection_confidence=0.8,
+            min_tracking_confidence=0.5,
+            static_image_mode=False,
+            max_num_hands=2)
+
+    def init_bpy_bridge(self, receiver=events.BpyUpdateReceiver):
+        from ..cgt_bridge import hand_drivers
         target = hand_drivers.BridgeHand()
-        self.observer = events.BpyUpdateReceiver(target)
+        self.observer = receiver(target)
         self.listener = events.UpdateListener()
 
     def init_debug_logs(self):
+        from ..cgt_bridge import hand_drivers
         target = hand_drivers.BridgeHand()
         # self.observer = events.DriverDebug(target)
         self.observer = events.PrintRawDataUpdate()
@@ -43,9 +35,24 @@ class HandDetector(abstract_detector.RealtimeDetector):
         # multi_hand_world_landmarks // multi_hand_landmarks
         return (
             [self.cvt2landmark_array(hand) for hand in mp_res.multi_hand_world_landmarks],
-            self.cvt_hand_orientation(mp_res.multi_handedness)
+            self.unique_handedness(self.cvt_hand_orientation(mp_res.multi_handedness), mp_res.multi_hand_landmarks)
         )
 
+    @staticmethod
+    def unique_handedness(orientation, hand_landmarks):
+        """ mediapipe labels both hands the same at times, the hand further right in the image becomes the right hand
+        then, like mediapipe labels hands assuming mirrored input. """
+        if orientation is None or len(orientation) != 2 or orientation[0][1] != orientation[1][1]:
+            return orientation
+        right = int(hand_landmarks[1].landmark[0].x > hand_landmarks[0].landmark[0].x)
+        return [[idx, idx == right] for idx, _ in orientation]
+
+    def filter_detection_result(self, data, timestamp):
+        hands, orientation = data
+        hands = [self.landmark_filter("HAND.R" if o[1] else "HAND.L", hand, timestamp)
+                 for hand, o in zip(hands, orientation)]
+        return hands, orientation
+
     def contains_features(self, mp_res):
         if not mp_res.multi_hand_landmarks and not mp_res.multi_handedness:
             return False
@@ -66,13 +73,20 @@ def stream_detection(tracking_handler):
     tracking_handler.stream_detection()
 
 
-def init_test():
+def benchmark(clip_path):
+    """ per frame latency on a recorded clip. """
+    tracking_handler = abstract_detector.init_benchmark(HandDetector, clip_path)
+    abstract_detector.per_frame_latency(tracking_handler)
+    del tracking_handler
+
+
+def init_test(camera_index=0):
     tracking_handler = HandDetector()
 
-    tracking_handler.stream = stream.Webcam()
+    tracking_handler.stream = stream.Webcam(camera_index=camera_index)
     tracking_handler.initialize_model()
     tracking_handler.init_debug_logs()
-    tracking_handler.listener.attach(tracking_handler.observer)
+    tracking_handler.attach_observer()
     return tracking_handler
 
 
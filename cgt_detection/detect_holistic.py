@@ -1,58 +1,73 @@
 import mediapipe as mp
+import numpy as np
 
 from . import abstract_detector
-from ..cgt_bridge import events, pose_drivers
+from ..cgt_bridge import events, payload
 from ..cgt_utils import stream
 
 
 class HolisticDetector(abstract_detector.RealtimeDetector):
-    def image_detection(self):
-        with self.solution.Holistic(
-                min_detection_confidence=0.7,
-                static_image_mode=True,
-        ) as mp_lib:
-            return self.exec_detection(mp_lib)
-
-    def stream_detection(self):
-        with self.solution.Holistic(
-                min_detection_confidence=0.8,
-                min_tracking_confidence=0.5,
-                static_image_mode=False,
-        ) as mp_lib:
-            while self.stream.capture.isOpened():
-                state = self.exec_detection(mp_lib)
-                if state == {'CANCELLED'}:
-                    return {'CANCELLED'}
+    payload_type = payload.HOLISTIC
+    # typical distance of the wrist to the middle finger mcp in meters
+    palm_length = 0.09
 
     def initialize_model(self):
         self.solution = mp.solutions.holistic
-
-    def init_bpy_bridge(self):
-        # TODO: requires multiple listeners. also requires a special observer pattern.
-        target = pose_drivers.BridgePose()
-        self.observer = events.BpyUpdateReceiver(target)
+        self.open_session(
+            self.solution.Holistic,
+            min_detection_confidence=0.8,
+            min_tracking_confidence=0.5,
+            static_image_mode=False,
+            model_complexity=1)
+
+    def init_bpy_bridge(self, receiver=events.BpyUpdateReceiver):
+        from ..cgt_bridge import face_drivers, hand_drivers, pose_drivers
+        # face, pose and hand bridges subscribe to their parts of the same inference
+        self.observers = [
+            [receiver(face_drivers.BridgeFace()), ("face",)],
+            [receiver(pose_drivers.BridgePose()), ("pose",)],
+            [receiver(hand_drivers.BridgeHand()), ("left_hand", "right_hand")],
+        ]
         self.listener = events.UpdateListener()
 
     def init_debug_logs(self):
-        self.observer = events.PrintRawDataUpdate()
+        self.observer, self.observers = events.PrintRawDataUpdate(), None
         self.listener = events.UpdateListener()
 
     def process_detection_result(self, mp_res):
         face, pose, l_hand, r_hand = None, None, None, None
-        if mp_res.pose_landmarks:
-            pose = self.cvt2landmark_array(mp_res.pose_landmarks)
+        # the pose bridge expects world landmarks like the pose detector provides
+        pose_landmarks = getattr(mp_res, 'pose_world_landmarks', None) or mp_res.pose_landmarks
+        if pose_landmarks:
+            pose = self.cvt2landmark_array(pose_landmarks)
         if mp_res.face_landmarks:
             face = self.cvt2landmark_array(mp_res.face_landmarks)
+        # holistic has no hand world landmarks, the hand bridge expects them like the hand detector provides
         if mp_res.left_hand_landmarks:
-            l_hand = self.cvt2landmark_array(mp_res.left_hand_landmarks)
+            l_hand = self.hand_world_landmarks(self.cvt2landmark_array(mp_res.left_hand_landmarks))
         if mp_res.right_hand_landmarks:
-            r_hand = self.cvt2landmark_array(mp_res.right_hand_landmarks)
+            r_hand = self.hand_world_landmarks(self.cvt2landmark_array(mp_res.right_hand_landmarks))
         return [face, pose, l_hand, r_hand]
 
+    def hand_world_landmarks(self, landmarks):
+        """ approximates metric hand landmarks (21, 3) centered on the wrist of normalized image landmarks.
+        x, y and z get the same scale by the frame size, then the palm gets scaled to a typical length. """
+        height, width = self.stream.raw.shape[:2]
+        landmarks = landmarks * np.array([width, height, width], dtype=np.float32)
+        landmarks -= landmarks[0]
+        length = np.linalg.norm(landmarks[9])
+        if length > 0:
+            landmarks *= self.palm_length / length
+        return landmarks
+
+    def filter_detection_result(self, data, timestamp):
+        keys = ["FACE", "POSE", "HAND.L", "HAND.R"]
+        return [None if landmarks is None else self.landmark_filter(key, landmarks, timestamp)
+                for key, landmarks in zip(keys, data)]
+
     def contains_features(self, mp_res):
-        if not mp_res.pose_landmarks:
-            return False
-        return True
+        return any([mp_res.pose_landmarks, mp_res.face_landmarks,
+                    mp_res.left_hand_landmarks, mp_res.right_hand_landmarks])
 
     def draw_result(self, s, mp_res, mp_drawings):
         mp_drawings.draw_landmarks(
@@ -86,13 +101,20 @@ def stream_detection(tracking_handler):
     tracking_handler.stream_detection()
 
 
-def init_test():
+def benchmark(clip_path):
+    """ per frame latency on a recorded clip. """
+    tracking_handler = abstract_detector.init_benchmark(HolisticDetector, clip_path)
+    abstract_detector.per_frame_latency(tracking_handler)
+    del tracking_handler
+
+
+def init_test(camera_index=0):
     tracking_handler = HolisticDetector()
 
-    tracking_handler.stream = stream.Webcam()
+    tracking_handler.stream = stream.Webcam(camera_index=camera_index)
     tracking_handler.initialize_model()
     tracking_handler.init_debug_logs()
-    tracking_handler.listener.attach(tracking_handler.observer)
+    tracking_handler.attach_observer()
     return tracking_handler
 
 
@@ -1,7 +1,7 @@
 import mediapipe as mp
 
 from . import abstract_detector
-from ..cgt_bridge import events, pose_drivers
+from ..cgt_bridge import events, payload
 from ..cgt_utils import stream
 
 
@@ -10,36 +10,28 @@ from ..cgt_utils import stream
 
 
 class PoseDetector(abstract_detector.RealtimeDetector):
-    def image_detection(self):
-        # BlazePose GHUM 3D
-        with self.solution.Pose(
-                static_image_mode=True,
-                model_complexity=1,
-                # model_complexity=2,
-                min_detection_confidence=0.7) as mp_lib:
-            return self.exec_detection(mp_lib)
-
-    def stream_detection(self):
-        with self.solution.Pose(
-                min_detection_confidence=0.8,
-                min_tracking_confidence=0.5,
-                static_image_mode=False,
-                smooth_segmentation=True
-        ) as mp_lib:
-            while self.stream.capture.isOpened():
-                state = self.exec_detection(mp_lib)
-                if state == {'CANCELLED'}:
-                    return {'CANCELLED'}
+    payload_type = payload.POSE
+    topics = ("pose",)
 
     def initialize_model(self):
+        # BlazePose GHUM 3D
         self.solution = mp.solutions.pose
-
-    def init_bpy_bridge(self):
+        self.open_session(
+            self.solution.Pose,
+            min_detection_confidence=0.8,
+            min_tracking_confidence=0.5,
+            static_image_mode=False,
+            model_complexity=1,
+            smooth_segmentation=True)
+
+    def init_bpy_bridge(self, receiver=events.BpyUpdateReceiver):
+        from ..cgt_bridge import pose_drivers
         target = pose_drivers.BridgePose()
-        self.observer = events.BpyUpdateReceiver(target)
+        self.observer = receiver(target)
         self.listener = events.UpdateListener()
 
     def init_driver_logs(self):
+        from ..cgt_bridge import pose_drivers
         target = pose_drivers.BridgePose()
         self.observer = events.DriverDebug(target)
         self.listener = events.UpdateListener()
@@ -51,6 +43,9 @@ class PoseDetector(abstract_detector.RealtimeDetector):
     def process_detection_result(self, mp_res):
         return self.cvt2landmark_array(mp_res.pose_world_landmarks)
 
+    def filter_detection_result(self, data, timestamp):
+        return self.landmark_filter("POSE", data, timestamp)
+
     def contains_features(self, mp_res):
         if not mp_res.pose_world_landmarks:
             return False
@@ -76,14 +71,21 @@ def stream_detection(tracking_handler):
     tracking_handler.stream_detection()
 
 
-def init_test():
+def benchmark(clip_path):
+    """ per frame latency on a recorded clip. """
+    tracking_handler = abstract_detector.init_benchmark(PoseDetector, clip_path)
+    abstract_detector.per_frame_latency(tracking_handler)
+    del tracking_handler
+
+
+def init_test(camera_index=0):
     tracking_handler = PoseDetector()
 
-    tracking_handler.stream = stream.Webcam()
+    tracking_handler.stream = stream.Webcam(camera_index=camera_index)
     tracking_handler.initialize_model()
     # tracking_handler.init_debug_logs()
     tracking_handler.init_driver_logs()
-    tracking_handler.listener.attach(tracking_handler.observer)
+    tracking_handler.attach_observer()
     return tracking_handler
 
 
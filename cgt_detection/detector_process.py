@@ -0,0 +1,153 @@
+import multiprocessing
+import time
+
+from ..cgt_bridge import events, payload, observer_pattern as op
+from ..cgt_utils import stream, shared_ring
+
+
+class RingPublisher(op.Observer):
+    """ Publishes detection results into a shared ring instead of applying them. """
+    def __init__(self, ring: shared_ring.SharedRing, solution: int, source: stream.Stream):
+        self.ring = ring
+        self.solution = solution
+        self.source = source
+        # perf counter when the detection of the current frame started
+        self.started = 0.0
+
+    def captured(self):
+        """ perf counter when the current frame got captured. video files carry media time instead,
+        their frames are decoded ahead, so the latency starts with the detection. """
+        if isinstance(self.source, stream.Webcam):
+            return self.source.timestamp
+        return self.started
+
+    def update(self, subject: op.Listener) -> None:
+        landmarks, meta = payload.pack(self.solution, subject.data)
+        published = time.perf_counter()
+        self.ring.publish(subject.frame, landmarks, meta, self.source.timestamp, published)
+        self.ring.header['detect_latency'] = published - self.captured()
+
+
+def init_detector(detector, camera_index: int = 0, path: str = "", frame_start: int = 0, key_step: int = 4,
+                  smooth: bool = False):
+    """ returns a tracking handler detecting the video file or webcam without preview, doesn't require bpy. """
+    tracking_handler = detector(frame_start=frame_start, key_step=key_step)
+    if path:
+        tracking_handler.stream = stream.VideoFileSource(path)
+    else:
+        tracking_handler.stream = stream.ThreadedWebcam(camera_index=camera_index)
+    tracking_handler.stream.preview = False
+    tracking_handler.initialize_model()
+    if smooth:
+        tracking_handler.init_filter()
+    return tracking_handler
+
+
+def detection_loop(tracking_handler, publisher, stop_event, on_frame=None):
+    """ detects till the stop event is set or the footage ends, results get passed to the publisher.
+    on frame receives the tracking handler after every detected frame. """
+    tracking_handler.observer = publisher
+    tracking_handler.listener = events.UpdateListener()
+    tracking_handler.listener.attach(publisher)
+
+    threaded = isinstance(tracking_handler.stream, stream.ThreadedWebcam)
+    while not stop_event.is_set() and tracking_handler.stream.capture.isOpened():
+        # don't poll the camera while there is no new frame
+        if threaded and not tracking_handler.stream.wait(0.1):
+            continue
+
+        publisher.started = time.perf_counter()
+        if tracking_handler.exec_detection(tracking_handler.session.mp_lib) == {'CANCELLED'}:
+            break
+        if on_frame is not None:
+            on_frame(tracking_handler)
+
+    tracking_handler.close_session()
+    tracking_handler.stream.release()
+
+
+def run_detector(detector, detection_type: str, ring_name: str, stop_event,
+                 camera_index: int = 0, path: str = "", frame_start: int = 0, key_step: int = 4, smooth: bool = False):
+    """ detects till the stop event is set or the footage ends and publishes the results to the ring.
+    runs in the detector process, doesn't require bpy. """
+    ring = shared_ring.SharedRing(ring_name)
+    tracking_handler = init_detector(detector, camera_index, path, frame_start, key_step, smooth)
+    publisher = RingPublisher(ring, payload.SOLUTIONS[detection_type], tracking_handler.stream)
+
+    def count_skipped(handler):
+        if isinstance(handler.stream, stream.ThreadedWebcam):
+            ring.header['skipped'] = handler.stream.dropped
+
+    detection_loop(tracking_handler, publisher, stop_event, count_skipped)
+    del tracking_handler
+    ring.close()
+
+
+class DetectorProcess:
+    """ Runs a detector in a separate process which publishes its results to a shared ring.
+    The ring is owned by the parent and gets unlinked when closing. """
+    def __init__(self, detector, detection_type: str, camera_index: int = 0, path: str = "",
+                 frame_start: int = 0, key_step: int = 4, smooth: bool = False, slots: int = 8):
+        self.solution = payload.SOLUTIONS[detection_type]
+        self.ring = shared_ring.SharedRing(slots=slots, rows=payload.ROWS[self.solution], create=True)
+
+        # spawn to not fork blender
+        context = multiprocessing.get_context('spawn')
+        self._stop = context.Event()
+        self.process = context.Process(
+            target=run_detector,
+            args=(detector, detection_type, self.ring.name, self._stop,
+                  camera_index, path, frame_start, key_step, smooth),
+            daemon=True)
+
+    def start(self):
+        self.process.start()
+
+    @property
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def stop(self, timeout: float = 5.0):
+        """ stops the detection, the process gets terminated if it doesn't finish in time. """
+        self._stop.set()
+        if self.process.pid is None:
+            return
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+    def close(self):
+        self.stop()
+        self.ring.close()
+        self.ring.unlink()
+
+
+# region manual tests
+def ring_benchmark(detector, detection_type: str, path: str):
+    """ detects a video file in a detector process and drains the ring in this process. """
+    from ..cgt_bridge import ring_receiver
+
+    detector_process = DetectorProcess(detector, detection_type, path=path, slots=16)
+    listener = events.UpdateListener()
+    receiver = ring_receiver.RingReceiver(detector_process.ring, detector_process.solution, listener)
+
+    detector_process.start()
+    start = time.perf_counter()
+    while detector_process.is_alive:
+        receiver.drain()
+        time.sleep(0.005)
+    receiver.drain()
+    duration = time.perf_counter() - start
+
+    header = detector_process.ring.header
+    print(f"DETECTOR PROCESS: published {int(header['published'])}, consumed {receiver.consumed}, "
+          f"dropped {receiver.dropped}, {receiver.consumed / duration:.1f} fps, "
+          f"detection to publish {header['detect_latency'] * 1000:.2f} ms, receive latency {receiver.latency * 1000:.2f} ms")
+    detector_process.close()
+
+
+if __name__ == '__main__':
+    from . import detect_hands
+    ring_benchmark(detect_hands.HandDetector, "HAND", "clip.mov")
+# endregion
@@ -0,0 +1,39 @@
+class ModelSession:
+    """ Keeps a mediapipe solution graph alive between detection calls.
+    Opening a solution builds the tflite graph, so a detector should open it once
+    and reuse it for every frame. Only then the tracking (non-static) mode engages. """
+    def __init__(self, model, **kwargs):
+        self.model = model
+        self.kwargs = kwargs
+        self.mp_lib = None
+
+    def open(self):
+        """ builds the graph if it isn't running yet and returns it. """
+        if self.mp_lib is None:
+            self.mp_lib = self.model(**self.kwargs)
+        return self.mp_lib
+
+    def close(self):
+        """ tears the graph down, the session may be reopened afterwards. """
+        if self.mp_lib is not None:
+            self.mp_lib.close()
+            self.mp_lib = None
+
+    def reopen(self, **kwargs):
+        """ rebuilds the graph with updated arguments, f.e. another model complexity. """
+        self.close()
+        self.kwargs.update(kwargs)
+        return self.open()
+
+    @property
+    def is_open(self):
+        return self.mp_lib is not None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
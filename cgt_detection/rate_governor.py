@@ -0,0 +1,100 @@
+import time
+
+
+# stages of a detected frame in the order they run
+STAGES = ("capture", "inference", "preview", "bridge", "keying")
+
+
+class StageTimer:
+    """ Measures the time spent in the stages of detected frames, smoothed over frames.
+    Every mark adds the time since the previous mark to the stage. Frames which don't
+    end, f.e. polls without a new camera frame, get discarded. """
+    def __init__(self, smoothing: float = 0.1):
+        self.smoothing = smoothing
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.current = dict.fromkeys(STAGES, 0.0)
+        self.last = 0.0
+        self.frames = 0
+
+    def begin(self):
+        for stage in self.current:
+            self.current[stage] = 0.0
+        self.last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.current[stage] += now - self.last
+        self.last = now
+
+    def end(self):
+        weight = 1.0 if self.frames == 0 else self.smoothing
+        for stage, duration in self.current.items():
+            self.stages[stage] += weight * (duration - self.stages[stage])
+        self.frames += 1
+
+    @property
+    def total(self):
+        return sum(self.stages.values())
+
+
+class RateGovernor:
+    """ Holds a target frame rate by trading inference resolution and model complexity for speed.
+    The settings are ordered from the best to the fastest, the governor steps through them
+    when the measured frame time leaves the budget. If the fastest settings are still too slow,
+    the detection interval grows instead, so blender stays responsive. """
+    def __init__(self, target_fps: float = 15.0, complexity: int = None,
+                 scales: tuple = (1.0, 0.75, 0.5), adapt_every: int = 15):
+        self.budget = 1 / target_fps
+        self.interval = self.budget
+        self.adapt_every = adapt_every
+        self.timer = StageTimer()
+
+        # solutions without complexity setting only adapt the resolution
+        complexities = [None] if complexity is None else list(range(complexity, -1, -1))
+        self.levels = [(scale, c) for c in complexities for scale in scales]
+        self.level = 0
+        self.adapted = 0
+
+    @property
+    def settings(self):
+        """ input scale and model complexity of the current level. """
+        return self.levels[self.level]
+
+    def govern(self, tracking_handler):
+        """ adapts the settings to the measured frame time every few frames and applies them.
+        returns True if the detection interval changed. """
+        if self.timer.frames - self.adapted < self.adapt_every:
+            return False
+        self.adapted = self.timer.frames
+
+        total, interval, level = self.timer.total, self.interval, self.level
+        if total > self.budget * 1.05:
+            if self.level < len(self.levels) - 1:
+                self.level += 1
+            elif abs(total * 1.1 - self.interval) > 0.1 * self.interval:
+                # reschedule only on considerable changes
+                self.interval = total * 1.1
+        elif total < self.budget * 0.7:
+            if self.interval > self.budget:
+                self.interval = max(self.budget, total * 1.1)
+            elif self.level > 0:
+                self.level -= 1
+
+        if level != self.level:
+            scale, complexity = self.settings
+            tracking_handler.input_scale = scale
+            if complexity is not None:
+                tracking_handler.set_model_complexity(complexity)
+        return interval != self.interval
+
+    def state(self):
+        """ chosen settings and measured stage times in seconds. """
+        scale, complexity = self.settings
+        return {
+            "scale": scale,
+            "complexity": complexity,
+            "interval": self.interval,
+            "budget": self.budget,
+            "total": self.timer.total,
+            **self.timer.stages
+        }
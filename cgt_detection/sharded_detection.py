@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from ..cgt_bridge import events, observer_pattern as op
+from ..cgt_utils import stream
+
+
+class ShardRecorder(op.Observer):
+    """ Stacks raw detection results of a shard by source frame index and timestamp.
+    Results of the warm up frames before the shard start get ignored. """
+    def __init__(self, source: stream.VideoFileSource, frame_start: int):
+        self.source = source
+        self.frame_start = frame_start
+        self.stack = []
+
+    def update(self, subject: op.Listener) -> None:
+        if self.source.frame_index >= self.frame_start:
+            self.stack.append((self.source.frame_index, subject.timestamp, subject.data))
+
+
+def video_frame_count(path: str):
+    """ returns the frame count the container reports, 0 if it's unknown. """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open video file: {path}")
+    frame_count = max(0, int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+    capture.release()
+    return frame_count
+
+
+def can_shard(frame_count: int, processes: int):
+    """ whether the frames can be split in a range per process, the frame count has to be known. """
+    return processes > 1 and frame_count >= processes
+
+
+def split_frame_range(frame_count: int, shards: int):
+    """ returns frame ranges [[start, end], ...] of similar length, none if there are no frames. """
+    bounds = np.linspace(0, frame_count, max(0, min(shards, frame_count)) + 1).astype(int)
+    return [[int(start), int(end)] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def detect_shard(detector, path: str, frame_start: int, frame_end: int, warm_up: int = 15, smooth: bool = False):
+    """ runs a detector on a frame range of a video, the tracker and filter warm up on the frames before the range.
+    returns [[frame_index, timestamp, data], ...] in frame order. """
+    tracking_handler = detector(frame_start=0, key_step=1)
+    tracking_handler.stream = stream.VideoFileSource(path, frame_start=max(0, frame_start - warm_up), frame_end=frame_end)
+    tracking_handler.stream.preview = False
+    tracking_handler.initialize_model()
+    if smooth:
+        tracking_handler.init_filter()
+
+    recorder = ShardRecorder(tracking_handler.stream, frame_start)
+    tracking_handler.observer = recorder
+    tracking_handler.listener = events.UpdateListener()
+    tracking_handler.listener.attach(recorder)
+
+    tracking_handler.stream_detection()
+    tracking_handler.close_session()
+    tracking_handler.stream.release()
+    del tracking_handler
+    return recorder.stack
+
+
+def sharded_detection(detector, path: str, processes: int = None, warm_up: int = 15, callback=None, smooth: bool = False):
+    """ splits the video in frame ranges and detects every range in a separate process.
+    returns the stitched results [[frame_index, timestamp, data], ...] in frame order.
+    the callback receives the processed and total frame count whenever a shard finished.
+    raises a ValueError if the frame count is unknown or smaller than the process count, see can_shard. """
+    frame_count = video_frame_count(path)
+    processes = processes or os.cpu_count()
+    if not can_shard(frame_count, processes):
+        raise ValueError(f"Cannot split {frame_count} frames in {processes} shards: {path}")
+    shards = split_frame_range(frame_count, processes)
+
+    # spawn to not fork blender
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+        futures = [executor.submit(detect_shard, detector, path, start, end, warm_up, smooth) for start, end in shards]
+
+        results, processed = [], 0
+        for future, (start, end) in zip(futures, shards):
+            results.extend(future.result())
+            processed += end - start
+            if callback is not None:
+                callback(processed, frame_count)
+    return results
+
+
+# region manual tests
+def throughput_benchmark(detector, path: str, processes: int = None):
+    """ compares frames per second of the single process path with the sharded detection. """
+    frame_count = video_frame_count(path)
+
+    start = time.perf_counter()
+    detect_shard(detector, path, 0, frame_count)
+    single = frame_count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    sharded_detection(detector, path, processes)
+    sharded = frame_count / (time.perf_counter() - start)
+
+    print(f"THROUGHPUT: single process {single:.1f} fps, sharded {sharded:.1f} fps")
+    return single, sharded
+
+
+if __name__ == '__main__':
+    from . import detect_hands
+    throughput_benchmark(detect_hands.HandDetector, "clip.mov")
+# endregion
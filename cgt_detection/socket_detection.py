@@ -0,0 +1,104 @@
+import argparse
+import multiprocessing
+import socket
+import threading
+import time
+
+from . import detector_process
+from ..cgt_bridge import payload, frame_protocol, observer_pattern as op
+from ..cgt_utils import stream
+
+
+class SocketPublisher(op.Observer):
+    """ Streams encoded detection results to a socket receiver. """
+    def __init__(self, address: str, solution: int, source: stream.Stream,
+                 half: bool = True, delta: bool = False, compress: bool = False):
+        family, address = frame_protocol.socket_address(address)
+        self.connection = socket.socket(family, socket.SOCK_STREAM)
+        self.connection.connect(address)
+        if family == socket.AF_INET:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.solution = solution
+        self.source = source
+        self.encoder = frame_protocol.FrameEncoder(solution, half, delta, compress)
+        self.started = 0.0
+        self.sent_bytes = 0
+
+    def update(self, subject: op.Listener) -> None:
+        landmarks, meta = payload.pack(self.solution, subject.data)
+        message = self.encoder.encode(subject.frame, landmarks, meta, self.source.timestamp)
+        self.connection.sendall(message)
+        self.sent_bytes += len(message)
+
+    def close(self):
+        self.connection.close()
+
+
+def stream_detector(detector, detection_type: str, address: str, stop_event=None,
+                    camera_index: int = 0, path: str = "", frame_start: int = 0, key_step: int = 4,
+                    smooth: bool = False, **encoding):
+    """ detects till the stop event is set or the footage ends and streams the results to the address.
+    doesn't require bpy, so it may run on another process or container. """
+    tracking_handler = detector_process.init_detector(detector, camera_index, path, frame_start, key_step, smooth)
+    publisher = SocketPublisher(address, payload.SOLUTIONS[detection_type], tracking_handler.stream, **encoding)
+
+    detector_process.detection_loop(tracking_handler, publisher, stop_event or threading.Event())
+    publisher.close()
+    del tracking_handler
+
+
+def get_detector(detection_type: str):
+    from . import detect_hands, detect_face, detect_pose, detect_holistic
+    detectors = {
+        "HAND": detect_hands.HandDetector,
+        "FACE": detect_face.FaceDetector,
+        "POSE": detect_pose.PoseDetector,
+        "HOLISTIC": detect_holistic.HolisticDetector,
+    }
+    return detectors[detection_type]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream detection results to blender.")
+    parser.add_argument("--type", default="HAND", choices=list(payload.SOLUTIONS))
+    parser.add_argument("--address", default="127.0.0.1:5005", help="host:port or unix socket path")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--path", default="", help="video file, detects the webcam if not set")
+    parser.add_argument("--key-step", type=int, default=4)
+    parser.add_argument("--smooth", action="store_true", help="filter landmark jitter before sending")
+    parser.add_argument("--float32", action="store_true", help="send float32 instead of float16 landmarks")
+    parser.add_argument("--delta", action="store_true", help="send differences to the previous frame")
+    parser.add_argument("--compress", action="store_true")
+    args = parser.parse_args()
+
+    stream_detector(get_detector(args.type), args.type, args.address,
+                    camera_index=args.camera, path=args.path, key_step=args.key_step, smooth=args.smooth,
+                    half=not args.float32, delta=args.delta, compress=args.compress)
+
+
+# region manual tests
+def socket_benchmark(detector, detection_type: str, path: str, address: str = "127.0.0.1:5005", **encoding):
+    """ streams a video file from a detector process to a receiver in this process. """
+    from ..cgt_bridge import events, socket_receiver
+
+    listener = events.UpdateListener()
+    receiver = socket_receiver.SocketReceiver(listener, payload.SOLUTIONS[detection_type], address)
+    sender = multiprocessing.get_context('spawn').Process(
+        target=stream_detector, args=(detector, detection_type, address), kwargs=dict(path=path, **encoding))
+
+    start = time.perf_counter()
+    sender.start()
+    while sender.is_alive() or receiver.connection is not None:
+        receiver.drain()
+        time.sleep(0.002)
+    duration = time.perf_counter() - start
+
+    print(f"SOCKET DETECTION: {receiver.consumed} frames, {receiver.received_bytes / max(1, receiver.consumed):.0f} "
+          f"bytes/frame, {receiver.consumed / duration:.1f} fps")
+    receiver.close()
+
+
+if __name__ == '__main__':
+    main()
+# endregion
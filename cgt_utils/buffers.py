@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class GrowableArray:
+    """ Preallocated array of rows which doubles its capacity when full.
+    Appending doesn't allocate till the capacity has been reached. """
+    def __init__(self, shape: tuple = (), dtype=np.float32, capacity: int = 256):
+        self._data = np.empty((max(1, capacity), *shape), dtype=dtype)
+        self.size = 0
+
+    def _reserve(self, size: int):
+        if size <= len(self._data):
+            return
+        capacity = len(self._data)
+        while capacity < size:
+            capacity *= 2
+        data = np.empty((capacity, *self._data.shape[1:]), dtype=self._data.dtype)
+        data[:self.size] = self._data[:self.size]
+        self._data = data
+
+    def append(self, value):
+        self._reserve(self.size + 1)
+        self._data[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        self._reserve(self.size + len(values))
+        self._data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    @property
+    def data(self):
+        """ view of the used rows. """
+        return self._data[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,68 @@
+import time
+
+import numpy as np
+
+
+def rdp_keep(co: np.ndarray, tolerance: float):
+    """ ramer douglas peucker decimation of keyframes co (N, 2) [[frame, value], ...].
+    the error is the value difference to the linear interpolation of the kept neighbours,
+    all segments of the curve get split at once per iteration. returns the mask of kept keys. """
+    count = len(co)
+    keep = np.ones(count, dtype=bool)
+    if count < 3:
+        return keep
+
+    keep[1:-1] = False
+    frames, values = co[:, 0], co[:, 1]
+    idx = np.arange(count)
+    while True:
+        kept = np.flatnonzero(keep)
+
+        # segment of every key between its kept neighbours
+        segment = np.minimum(np.searchsorted(kept, idx, side='right') - 1, len(kept) - 2)
+        start, end = kept[segment], kept[segment + 1]
+        weight = (frames - frames[start]) / (frames[end] - frames[start])
+        error = np.abs(values - (values[start] + weight * (values[end] - values[start])))
+        error[keep] = 0
+
+        max_error = np.maximum.reduceat(error, kept[:-1])
+        split = max_error > tolerance
+        if not split.any():
+            return keep
+
+        # split segments at their first key with the max error
+        candidates = np.flatnonzero(split[segment] & (error == max_error[segment]) & ~keep)
+        _, first = np.unique(segment[candidates], return_index=True)
+        keep[candidates[first]] = True
+
+
+def interpolation_error(co: np.ndarray, keep: np.ndarray):
+    """ max value difference of the keyframes to the linear interpolation of the kept keys. """
+    if len(co) == 0:
+        return 0.0
+    return float(np.abs(np.interp(co[:, 0], co[keep, 0], co[keep, 1]) - co[:, 1]).max())
+
+
+# region manual tests
+def rdp_benchmark(count: int = 2000, curves: int = 200, tolerance: float = 0.001):
+    """ key reduction, error and time of decimating noisy tracking like curves. """
+    rng = np.random.default_rng(0)
+    frames = np.arange(count, dtype=np.float32)
+
+    removed, max_error, start = 0, 0.0, time.perf_counter()
+    for _ in range(curves):
+        # mostly still channel with occasional motion and some jitter
+        motion = np.cumsum(rng.normal(0, 0.002, count) * (rng.random(count) > 0.8))
+        co = np.stack([frames, motion + rng.normal(0, 0.0002, count)], axis=1).astype(np.float32)
+        keep = rdp_keep(co, tolerance)
+        removed += count - np.count_nonzero(keep)
+        max_error = max(max_error, interpolation_error(co, keep))
+    duration = time.perf_counter() - start
+
+    print(f"RDP: {removed / (count * curves) * 100:.1f}% keys removed, max error {max_error:.2e}, "
+          f"{duration / curves * 1000:.2f} ms per curve of {count} keys")
+
+
+if __name__ == '__main__':
+    rdp_benchmark()
+# endregion
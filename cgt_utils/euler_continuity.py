@@ -0,0 +1,126 @@
+import time
+
+import numpy as np
+
+from . import m_V
+
+
+def wrap_angles(angles: np.ndarray):
+    """ returns angles wrapped to [-pi, pi). """
+    return np.remainder(angles + np.pi, 2 * np.pi) - np.pi
+
+
+def euler_distance(eulers: np.ndarray, previous: np.ndarray):
+    """ summed angle differences (...) of eulers (..., 3) to previous eulers, ignoring full turns. """
+    return np.abs(wrap_angles(eulers - previous)).sum(axis=-1)
+
+
+def euler_pairs(quarts: np.ndarray, order: str):
+    """ both euler solutions (..., 3) of quaternions (..., 4). """
+    quarts = quarts / np.linalg.norm(quarts, axis=-1, keepdims=True)
+    return m_V.matrix_to_euler_pair(m_V.quaternion_to_matrix(quarts), order)
+
+
+class EulerContinuity:
+    """ Converts quaternions of rotation channels to eulers continuing the previous euler of their channel.
+    Of both euler solutions the one closer to the previous euler gets chosen and full turns get unwrapped.
+    Channels without previous euler start with the solution of smaller angles like mathutils. """
+    def __init__(self, channels: int, order: str = 'XYZ'):
+        self.order = order
+        self.previous = np.zeros((channels, 3), dtype=np.float32)
+        self.tracked = np.zeros(channels, dtype=bool)
+
+    def reset(self):
+        self.tracked[:] = False
+
+    def __call__(self, quarts: np.ndarray, channels: np.ndarray = None):
+        """ returns eulers (C, 3) of quaternions (C, 4) of the channels, all channels if None.
+        nan quaternions return nan eulers and keep the previous euler of their channel. """
+        channels = np.arange(len(self.previous)) if channels is None else np.asarray(channels)
+        first, second = euler_pairs(quarts, self.order)
+
+        tracked = self.tracked[channels, np.newaxis]
+        previous = np.where(tracked, self.previous[channels], 0)
+        closer = euler_distance(second, previous) < euler_distance(first, previous)
+        eulers = np.where(closer[:, np.newaxis], second, first)
+        eulers = np.where(tracked, previous + wrap_angles(eulers - previous), eulers)
+
+        valid = ~np.isnan(eulers).any(axis=-1)
+        self.previous[channels[valid]] = eulers[valid]
+        self.tracked[channels[valid]] = True
+        return eulers
+
+
+# region offline
+def choose_branches(first: np.ndarray, second: np.ndarray):
+    """ returns flags (F,) which are set where the second euler solution (F, 3) continues the previous frame.
+    every frame maps the branch of the previous frame to its closer solution. the branches follow from
+    the last frame choosing regardless of the previous branch and the swaps since, so no frame loop is required. """
+    start = np.abs(second[0]).sum() < np.abs(first[0]).sum()
+    after_first = euler_distance(second[1:], first[:-1]) < euler_distance(first[1:], first[:-1])
+    after_second = euler_distance(second[1:], second[:-1]) < euler_distance(first[1:], second[:-1])
+
+    fixed = np.concatenate([[True], after_first == after_second])
+    value = np.concatenate([[start], after_first])
+    swaps = np.cumsum(np.concatenate([[False], after_first & ~after_second]))
+
+    last_fixed = np.maximum.accumulate(np.where(fixed, np.arange(len(fixed)), 0))
+    return (value[last_fixed] + swaps - swaps[last_fixed]) % 2 == 1
+
+
+def unwrap_take(quarts: np.ndarray, order: str = 'XYZ'):
+    """ returns continuous eulers (F, C, 3) of quaternion channels (F, C, 4) of a take,
+    the same eulers as EulerContinuity frame by frame. missing rotations as nan stay nan. """
+    pairs = euler_pairs(quarts, order)
+    eulers = np.full(pairs[0].shape, np.nan, dtype=pairs[0].dtype)
+    for channel in range(quarts.shape[1]):
+        rows = np.flatnonzero(~np.isnan(pairs[0][:, channel]).any(axis=-1))
+        if len(rows) == 0:
+            continue
+
+        first, second = pairs[0][rows, channel], pairs[1][rows, channel]
+        chosen = np.where(choose_branches(first, second)[:, np.newaxis], second, first)
+        steps = wrap_angles(np.diff(chosen, axis=0))
+        eulers[rows, channel] = chosen[0] + np.concatenate([np.zeros((1, 3), dtype=chosen.dtype),
+                                                            np.cumsum(steps, axis=0)])
+    return eulers
+# endregion
+
+
+# region manual tests
+def continuity_benchmark(frames: int = 2000, channels: int = 3, order: str = 'XZY'):
+    """ compares unwrapping a take to converting it frame by frame.
+    the rotations wander randomly, so they pass gimbal locks and full turns. """
+    rng = np.random.default_rng(0)
+    axes = rng.normal(size=(frames, channels, 3))
+    axes /= np.linalg.norm(axes, axis=-1, keepdims=True)
+    half = rng.normal(0, 0.05, (frames, channels, 1))
+    steps = np.concatenate([np.cos(half), np.sin(half) * axes], axis=-1)
+
+    quarts = np.empty_like(steps)
+    quarts[0] = steps[0]
+    for frame in range(1, frames):
+        quarts[frame] = m_V.quaternion_multiply(steps[frame], quarts[frame - 1])
+    # quaternion signs don't matter, some frames miss
+    quarts *= np.where(rng.random((frames, channels, 1)) < 0.5, -1, 1)
+    quarts[rng.random(frames) < 0.05, 0] = np.nan
+
+    start = time.perf_counter()
+    continuity = EulerContinuity(channels, order)
+    looped = np.array([continuity(frame) for frame in quarts])
+    looped_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    unwrapped = unwrap_take(quarts, order)
+    unwrap_duration = time.perf_counter() - start
+
+    tracked = ~np.isnan(looped)
+    max_step = max(np.abs(np.diff(unwrapped[~np.isnan(unwrapped[:, c, 0]), c], axis=0)).max() for c in range(channels))
+    print(f"EULER CONTINUITY: looped {looped_duration * 1000:.1f} ms, unwrapped {unwrap_duration * 1000:.2f} ms, "
+          f"same missing {np.array_equal(tracked, ~np.isnan(unwrapped))}, "
+          f"max diff {np.abs(looped[tracked] - unwrapped[tracked]).max():.2e}, max step {max_step:.2f}")
+
+
+if __name__ == '__main__':
+    continuity_benchmark()
+# endregion
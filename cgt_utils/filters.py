@@ -0,0 +1,190 @@
+import time
+from math import pi
+
+import numpy as np
+
+
+# one euro parameters per landmark set, face landmarks are normalized image coordinates,
+# hand and pose landmarks are world coordinates in meters
+PRESETS = {
+    "FACE": dict(min_cutoff=1.0, beta=8.0, d_cutoff=1.0),
+    "HAND": dict(min_cutoff=1.5, beta=15.0, d_cutoff=1.0),
+    "POSE": dict(min_cutoff=1.0, beta=5.0, d_cutoff=1.0),
+}
+
+
+class OneEuroFilter:
+    """ One euro filter of landmarks (N, 3) updating all landmarks at once.
+    Every landmark adapts its cutoff to its own speed, slow landmarks get smoothed
+    while fast landmarks follow with little lag. """
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 0.0, d_cutoff: float = 1.0, fallback_rate: float = 30.0):
+        self.min_cutoff, self.beta, self.d_cutoff = min_cutoff, beta, d_cutoff
+        self.fallback_dt = 1 / fallback_rate
+        self.x, self.dx, self.timestamp = None, None, None
+        self._delta, self._speed = None, None
+
+    @staticmethod
+    def alpha(cutoff, dt: float):
+        return 1 / (1 + 1 / (2 * pi * cutoff * dt))
+
+    def reset(self, landmarks: np.ndarray, timestamp: float):
+        self.x = np.array(landmarks, dtype=np.float32)
+        self.dx = np.zeros_like(self.x)
+        self._delta = np.empty_like(self.x)
+        self._speed = np.empty((len(self.x), 1), dtype=np.float32)
+        self.timestamp = timestamp
+
+    def __call__(self, landmarks: np.ndarray, timestamp: float):
+        """ returns the filtered landmarks, the filter restarts if the amount of landmarks changes. """
+        if self.x is None or self.x.shape != landmarks.shape:
+            self.reset(landmarks, timestamp)
+            return self.x.copy()
+
+        dt = timestamp - self.timestamp
+        if dt <= 0:
+            dt = self.fallback_dt
+        self.timestamp = timestamp
+
+        # smoothed derivative
+        np.subtract(landmarks, self.x, out=self._delta)
+        self.dx += self.alpha(self.d_cutoff, dt) * (self._delta / dt - self.dx)
+
+        # cutoff per landmark based on its speed
+        np.sqrt(np.einsum('ij,ij->i', self.dx, self.dx), out=self._speed[:, 0])
+        alpha = self.alpha(self.min_cutoff + self.beta * self._speed, dt)
+
+        self._delta *= alpha
+        self.x += self._delta
+        return self.x.copy()
+
+
+class LandmarkFilters:
+    """ One euro filters of the landmark sets of a detector, created on first use per key.
+    The preset depends on the key, f.e. 'HAND.L' uses the hand preset.
+    Filters restart if their landmarks haven't been tracked for a while. """
+    def __init__(self, reset_after: float = 0.5):
+        self.reset_after = reset_after
+        self.filters = {}
+
+    def __call__(self, key: str, landmarks: np.ndarray, timestamp: float):
+        landmark_filter = self.filters.get(key)
+        if landmark_filter is None:
+            landmark_filter = self.filters[key] = OneEuroFilter(**PRESETS[key.split('.')[0]])
+        elif timestamp - landmark_filter.timestamp > self.reset_after:
+            landmark_filter.reset(landmarks, timestamp)
+        return landmark_filter(landmarks, timestamp)
+
+
+# region offline
+def take_breaks(frames: np.ndarray, max_gap: float = None):
+    """ returns (F,) flags which are set where a new segment starts as the previous frame is too far away.
+    the max gap defaults to 1.5 times the usual spacing of the frames. """
+    breaks = np.zeros(len(frames), dtype=bool)
+    if len(frames) < 2:
+        return breaks
+    spacing = np.diff(frames)
+    if max_gap is None:
+        max_gap = 1.5 * np.median(spacing)
+    breaks[1:] = spacing > max_gap
+    return breaks
+
+
+def savgol_coefficients(window: int, order: int):
+    """ least squares coefficients of a centered polynomial fit. """
+    half = window // 2
+    vandermonde = np.arange(-half, half + 1)[:, np.newaxis] ** np.arange(order + 1)
+    return np.linalg.pinv(vandermonde)[0]
+
+
+def savgol_segment(data: np.ndarray, window: int, order: int):
+    """ zero phase savitzky golay smoothing of a segment (F, M) without gaps.
+    edges get extended with their odd reflection, which preserves linear motion. """
+    window = min(window | 1, len(data) - 1 + len(data) % 2)
+    if window <= order:
+        return data
+
+    half = window // 2
+    padded = np.concatenate([
+        2 * data[:1] - data[half:0:-1],
+        data,
+        2 * data[-1:] - data[-2:-half - 2:-1]
+    ])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=0)
+    return windows @ savgol_coefficients(window, order).astype(data.dtype)
+
+
+def savgol_smooth(data: np.ndarray, window: int = 9, order: int = 2, breaks: np.ndarray = None):
+    """ zero phase smoothing of a take (F, ...) along the frames.
+    values don't get smoothed across nan or breaks, every tracked segment gets smoothed on its own.
+    columns missing at the same frames, f.e. all landmarks of a hand, get smoothed at once. """
+    frames = len(data)
+    columns = data.reshape(frames, -1)
+    smoothed = columns.copy()
+    breaks = np.zeros(frames, dtype=bool) if breaks is None else breaks
+
+    patterns, inverse = np.unique(np.isnan(columns), axis=1, return_inverse=True)
+    for pattern_idx, missing in enumerate(patterns.T):
+        cols = np.flatnonzero(inverse.reshape(-1) == pattern_idx)
+
+        # bounds of the tracked segments
+        tracked = ~missing
+        first = tracked & (breaks | ~np.concatenate([[False], tracked[:-1]]))
+        last = tracked & (np.concatenate([breaks[1:], [True]]) | ~np.concatenate([tracked[1:], [False]]))
+        for start, end in zip(np.flatnonzero(first), np.flatnonzero(last) + 1):
+            smoothed[start:end, cols] = savgol_segment(columns[start:end, cols], window, order)
+
+    return smoothed.reshape(data.shape)
+
+
+def resample_take(frames: np.ndarray, data: np.ndarray, step: float = 1.0, max_gap: float = None):
+    """ linear interpolation of a take (F, ...) onto a regular grid of frames.
+    grid frames inside gaps don't get sampled, so missing detections don't get interpolated.
+    returns the grid frames and the resampled data. """
+    if len(frames) < 2:
+        return frames, data
+
+    grid = np.arange(np.ceil(frames[0] / step) * step, frames[-1] + step / 2, step)
+    breaks = take_breaks(frames, max_gap)
+
+    # neighbouring samples of every grid frame
+    upper = np.clip(np.searchsorted(frames, grid), 1, len(frames) - 1)
+    lower = upper - 1
+    inside = ~breaks[upper] | (grid == frames[upper]) | (grid == frames[lower])
+    grid, lower, upper = grid[inside], lower[inside], upper[inside]
+
+    weight = ((grid - frames[lower]) / (frames[upper] - frames[lower])).astype(data.dtype)
+    weight = weight.reshape(-1, *([1] * (data.ndim - 1)))
+    resampled = data[lower] + weight * (data[upper] - data[lower])
+
+    # exact samples stay exact, even if their neighbour is missing
+    exact = grid == frames[upper]
+    resampled[exact] = data[upper[exact]]
+    return grid.astype(np.float32), resampled
+# endregion
+
+
+# region manual tests
+def filter_benchmark(frames: int = 2000, rows: int = 478):
+    """ per frame cost of filtering the refined face mesh and the remaining jitter. """
+    rng = np.random.default_rng(0)
+    motion = np.sin(np.linspace(0, 4 * pi, frames))[:, None, None] * 0.05 + rng.random((rows, 3))
+    landmarks = (motion + rng.normal(0, 0.002, (frames, rows, 3))).astype(np.float32)
+
+    filters = LandmarkFilters()
+    filtered = np.empty_like(landmarks)
+    start = time.perf_counter()
+    for i, frame in enumerate(landmarks):
+        filtered[i] = filters("FACE", frame, i / 30)
+    duration = (time.perf_counter() - start) / frames
+
+    def jitter(data):
+        return np.abs(np.diff(data, n=2, axis=0)).mean()
+
+    print(f"ONE EURO FILTER: {duration * 1e6:.1f} us/frame for {rows} landmarks, "
+          f"jitter {jitter(landmarks):.2e} -> {jitter(filtered):.2e}")
+    return duration
+
+
+if __name__ == '__main__':
+    filter_benchmark()
+# endregion
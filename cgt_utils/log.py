@@ -1,3 +1,4 @@
+import csv
 import logging
 
 
@@ -76,3 +77,12 @@ def clear_logs():
     for log in logs:
         with open(log, 'w'):
             pass
+
+
+def write_csv(file_name, header, rows):
+    """ writes rows with a header as csv file, f.e. profiling results. """
+    with open(file_name, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(header)
+        writer.writerows(rows)
+    logger.info(f"wrote {len(rows)} rows to {file_name}")
@@ -1,7 +1,6 @@
 import math
 
 import numpy as np
-from mathutils import Euler, Matrix, Vector
 
 
 # region vector cgt_utils
@@ -23,8 +22,8 @@ def normalize(vector: np.array):
 
 
 def vector_length_2d(v1, v2, del_axis: str = ""):
-    """ returns the magnitude between two vectors. """
-    remove_axis([v1, v2], del_axis)
+    """ returns the magnitude between two vectors ignoring the deleted axis. """
+    v1, v2 = remove_axis([v1, v2], del_axis)
     vec = to_vector(v1, v2)
     return vector_length(vec)
 
@@ -40,21 +39,20 @@ def get_vector_distance(v1, v2):
 
 # region axis helper
 def remove_axis(vectors, *args):
-    """ delete one axis to calculate 2d intersection point """
+    """ delete axes of an array of vectors to calculate 2d intersection point """
     axis = {
         "X": 0,
         "Y": 1,
         "Z": 2
     }
-    res = []
+    indices = []
     for arg in args:
         try:
-            for vec in vectors:
-                res.append([np.delete(vec, axis[arg]) for arg in args])
+            indices.append(axis[arg])
         except KeyError:
             print(arg, "AXIS NOT AVAILABLE")
 
-    return res
+    return np.delete(np.asarray(vectors), indices, axis=-1)
 
 
 def null_axis(vectors, *args):
@@ -89,15 +87,6 @@ def angle_between(v1: np.array, v2: np.array):
     return np.arccos(limited_dot)
 
 
-# TODO: remove and replace with numpy
-def rotate_towards(origin, destination, track='Z', up='Y'):
-    """ returns rotation from an origin to a destination. """
-    vec = Vector((destination - origin))
-    vec = vec.normalized()
-    quart = vec.to_track_quat(track, up)
-    return quart
-
-
 # region joint
 def joint_angles(vertices, joints):
     angles = [joint_angle(vertices, joint) for joint in joints]
@@ -112,6 +101,18 @@ def joint_angle(vertices, joint):
     return angle
 
 
+def segment_angles(points: np.array, first: np.array, second: np.array):
+    """ returns angles in radians (..., J) between segments of points (..., N, 3).
+    segments are [start, end] index pairs (J, 2), all segment pairs get gathered and solved at once,
+    f.e. the joint angle of [0, 1, 2] is the angle between [0, 1] and [1, 2]. """
+    u = points[..., first[:, 1], :] - points[..., first[:, 0], :]
+    v = points[..., second[:, 1], :] - points[..., second[:, 0], :]
+    dot = np.einsum('...i,...i->...', u, v)
+    norm = np.sqrt(np.einsum('...i,...i->...', u, u) * np.einsum('...i,...i->...', v, v))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.arccos(np.clip(dot / norm, -1.0, 1.0))
+
+
 # endregion
 # endregion
 # endregion
@@ -191,81 +192,281 @@ def create_normal_array(vertices: np.array, faces: np.array):
 
 
 # region matrix
-# todo: remove and replace with numpy
-# http://renderdan.blogspot.com/2006/05/rotation-matrix-from-axis-vectors.html
-def generate_matrix(tangent: np.array, normal: np.array, binormal: np.array):
-    """ returns matrix
-    -> tangent = towards left and right [+X]
-    -> normal = origin towards front [+Y]
-    -> binormal = cross product of tanget and normal if +z1 [+Z] """
-    return Matrix((
-        [tangent[0], tangent[1], tangent[2], 0],
-        [normal[0], normal[1], normal[2], 0],
-        [binormal[0], binormal[1], binormal[2], 0],
-        [0, 0, 0, 1],
-    ))
-
-
 def main():
     # testing for further updates
     tangent = np.array([0, 1, 0])
     normal = np.array([0, 4, 1])
     binormal = np.array([1, 0, 0])
 
-    matrix = np_genenerate_matrix(tangent, normal, binormal)
-    loc, rot_matrix, scale = np_decompose_matrix(matrix)
+    matrix = np_generate_matrix(tangent, normal, binormal)
+    loc, quart, scale = np_decompose_matrix(matrix)
     print(matrix)
-    print("\nloc\n", loc, "\nrot\n", rot_matrix, "\nsca\n", scale)
+    print("\nloc\n", loc, "\nrot\n", quart, "\nsca\n", scale)
 
 
-def np_genenerate_matrix(tangent: np.array, normal: np.array, binormal: np.array):
-    """ generate a numpy matrix at loc [0, 0, 0]. """
-    matrix = np.array([
-        [tangent[0], tangent[1], tangent[2], 0],
-        [normal[0], normal[1], normal[2], 0],
-        [binormal[0], binormal[1], binormal[2], 0],
-        [0, 0, 0, 1]])
+# http://renderdan.blogspot.com/2006/05/rotation-matrix-from-axis-vectors.html
+def np_generate_matrix(tangent: np.array, normal: np.array, binormal: np.array):
+    """ returns matrices (..., 4, 4) at loc [0, 0, 0] with the vectors (..., 3) as rows
+    -> tangent = towards left and right [+X]
+    -> normal = origin towards front [+Y]
+    -> binormal = cross product of tanget and normal if +z1 [+Z] """
+    tangent, normal, binormal = np.broadcast_arrays(tangent, normal, binormal)
+    matrix = np.zeros((*tangent.shape[:-1], 4, 4), dtype=np.result_type(tangent, np.float32))
+    matrix[..., 0, :3], matrix[..., 1, :3], matrix[..., 2, :3] = tangent, normal, binormal
+    matrix[..., 3, 3] = 1
     return matrix
 
 
-def np_decompose_matrix(matrix):
-    # location -> last column of matrix
-    loc = matrix[:3, 3:4]
+def nearest_rotation(matrix: np.array):
+    """ returns the closest rotation matrices (..., 3, 3) of matrices, the rotation of their polar decomposition.
+    skewed bases get orthonormalized without preferring any axis, nan matrices stay nan. """
+    valid = np.isfinite(matrix).all(axis=(-2, -1))
+    u, _, vt = np.linalg.svd(np.where(valid[..., np.newaxis, np.newaxis], matrix, np.eye(3, dtype=matrix.dtype)))
+    # flip the axis of the smallest singular value instead of reflecting
+    u[..., :, -1] *= np.where(np.linalg.det(u @ vt) < 0, -1, 1)[..., np.newaxis]
+    return np.where(valid[..., np.newaxis, np.newaxis], u @ vt, np.nan)
 
-    # scale -> length of the first the column vectors
-    sx = vector_length(matrix[:3, 0:1])
-    sy = vector_length(matrix[:3, 1:2])
-    sz = vector_length(matrix[:3, 2:3])
-    sca = np.array([sx, sy, sz])
 
-    # rotation -> divide first three column vectors by the scaling factors
-    # todo: fix for negative scale and apply shear
-    c1 = matrix[:3, 0:1] / sx
-    c2 = matrix[:3, 1:2] / sy
-    c3 = matrix[:3, 2:3] / sz
+def np_decompose_matrix(matrix: np.array):
+    """ returns loc (..., 3), quaternion (..., 4) and scale (..., 3) of matrices (..., 4, 4) like mathutils.
+    the rotation of skewed matrices is their nearest rotation, mathutils results depend on its version there. """
+    loc = matrix[..., :3, 3]
 
-    # recreate matrix (loc = [0, 0, 0]
-    rotation_matrix = np.array([np.append(col, [v]) for col, v in
-                                [[c1, 0], [c2, 0], [c3, 0], [loc, 1]]])
+    # scale -> length of the column vectors, negative if the matrix flips
+    sca = np.sqrt(np.einsum('...ij,...ij->...j', matrix[..., :3, :3], matrix[..., :3, :3]))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sca = np.where(np.linalg.det(matrix[..., :3, :3])[..., np.newaxis] < 0, -sca, sca)
 
-    # todo: quaternion from rotation matrix
-    return loc, rotation_matrix, sca
+        # rotation -> divide the column vectors by the scaling factors
+        rotation = matrix[..., :3, :3] / sca[..., np.newaxis, :]
+    return loc, matrix_to_quaternion(nearest_rotation(rotation)), sca
 
 
-def decompose_matrix(matrix: Matrix):
-    """ returns loc, quaternion, scale """
-    loc, quart, scale = matrix.decompose()
-    quart.invert()
-    return loc, quart, scale
+def decompose_matrix(matrix: np.array):
+    """ returns loc, inverted quaternion, scale """
+    loc, quart, scale = np_decompose_matrix(matrix)
+    return loc, quaternion_invert(quart), scale
+# endregion
 
 
-def to_euler(quart, combat=Euler(), space='XYZ', ):
-    euler = quart.to_euler(space, combat)
-    return euler
+# region quaternion
+# quaternions are [w, x, y, z] arrays (..., 4) like mathutils
+def matrix_to_quaternion(matrix: np.array):
+    """ returns quaternions of rotation matrices (..., 3, 3) with positive w.
+    like mathutils, quaternions only get normalized if they are far from unit length. """
+    # blenders column major notation, m[col, row]
+    m = np.swapaxes(matrix, -1, -2)
+    m00, m11, m22 = m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]
+
+    # every row solves the quaternion, precise where its diagonal is large
+    traces = [1 + m00 + m11 + m22, 1 + m00 - m11 - m22, 1 - m00 + m11 - m22, 1 - m00 - m11 + m22]
+    yz, zx, xy = m[..., 1, 2] - m[..., 2, 1], m[..., 2, 0] - m[..., 0, 2], m[..., 0, 1] - m[..., 1, 0]
+    xy_, zx_, yz_ = m[..., 0, 1] + m[..., 1, 0], m[..., 2, 0] + m[..., 0, 2], m[..., 1, 2] + m[..., 2, 1]
+    rows = np.stack([
+        np.stack([traces[0], yz, zx, xy], axis=-1),
+        np.stack([yz, traces[1], xy_, zx_], axis=-1),
+        np.stack([zx, xy_, traces[2], yz_], axis=-1),
+        np.stack([xy, zx_, yz_, traces[3]], axis=-1),
+    ], axis=-2)
+
+    branch = np.where(m22 < 0, np.where(m00 > m11, 1, 2), np.where(m00 < -m11, 3, 0))
+    row = np.take_along_axis(rows, branch[..., np.newaxis, np.newaxis], axis=-2)[..., 0, :]
+    trace = np.take_along_axis(row, branch[..., np.newaxis], axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        quart = row / (2 * np.sqrt(np.maximum(trace, 0)))
+    quart = np.where(quart[..., :1] < 0, -quart, quart)
+    length = np.einsum('...i,...i->...', quart, quart)[..., np.newaxis]
+    return np.where(np.abs(length - 1) >= 0.0006, quart / np.sqrt(length), quart)
+
+
+def quaternion_to_matrix(quart: np.array):
+    """ returns rotation matrices (..., 3, 3) of unit quaternions. """
+    w, x, y, z = np.moveaxis(quart, -1, 0)
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], axis=-1),
+        np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], axis=-1),
+        np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=-2)
+
+
+def quaternion_invert(quart: np.array):
+    """ returns the inverse of quaternions. """
+    return quart * np.array([1, -1, -1, -1], dtype=quart.dtype) / np.einsum('...i,...i->...', quart, quart)[..., np.newaxis]
+
+
+def quaternion_multiply(a: np.array, b: np.array):
+    """ returns the hamilton products a * b, rotating by b first. """
+    aw, ax, ay, az = np.moveaxis(a, -1, 0)
+    bw, bx, by, bz = np.moveaxis(b, -1, 0)
+    return np.stack([
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by + ay * bw + az * bx - ax * bz,
+        aw * bz + az * bw + ax * by - ay * bx,
+    ], axis=-1)
+
+
+# axes of euler orders and if they are odd permutations of xyz
+EULER_ORDERS = {
+    'XYZ': ((0, 1, 2), False),
+    'XZY': ((0, 2, 1), True),
+    'YXZ': ((1, 0, 2), True),
+    'YZX': ((1, 2, 0), False),
+    'ZXY': ((2, 0, 1), False),
+    'ZYX': ((2, 1, 0), True),
+}
+
+
+def matrix_to_euler_pair(matrix: np.array, order: str = 'XYZ'):
+    """ returns both euler solutions (..., 3) [x, y, z] of rotation matrices (..., 3, 3) in the rotation order. """
+    (i, j, k), parity = EULER_ORDERS[order]
+    # blenders column major notation, m[col, row]
+    m = np.swapaxes(matrix, -1, -2)
+    cy = np.hypot(m[..., i, i], m[..., i, j])
+
+    first, second = np.empty((*cy.shape, 3), dtype=cy.dtype), np.empty((*cy.shape, 3), dtype=cy.dtype)
+    first[..., i] = np.arctan2(m[..., j, k], m[..., k, k])
+    first[..., j] = np.arctan2(-m[..., i, k], cy)
+    first[..., k] = np.arctan2(m[..., i, j], m[..., i, i])
+    second[..., i] = np.arctan2(-m[..., j, k], -m[..., k, k])
+    second[..., j] = np.arctan2(-m[..., i, k], -cy)
+    second[..., k] = np.arctan2(-m[..., i, j], -m[..., i, i])
+
+    # gimbal lock, the first and last axis rotate around the same axis
+    locked = cy <= 16 * np.finfo(np.float32).eps
+    if locked.any():
+        first[locked, i] = np.arctan2(-m[locked, k, j], m[locked, j, j])
+        first[locked, k] = 0
+        second[locked] = first[locked]
+
+    if parity:
+        return -first, -second
+    return first, second
+
+
+def quaternion_to_euler(quart: np.array, order: str = 'XYZ'):
+    """ returns eulers (..., 3) of quaternions, the solution with the smaller angles like mathutils. """
+    quart = quart / np.linalg.norm(quart, axis=-1, keepdims=True)
+    first, second = matrix_to_euler_pair(quaternion_to_matrix(quart), order)
+    smaller = np.abs(first).sum(axis=-1) <= np.abs(second).sum(axis=-1)
+    return np.where(smaller[..., np.newaxis], first, second)
+
+
+def track_quaternion(vectors: np.array, track: str = 'Z', up: str = 'Y'):
+    """ returns quaternions pointing the track axis along vectors (..., 3) while the up axis points up,
+    like mathutils Vector.to_track_quat. tracks may be negative axes, f.e. '-Z'. """
+    axis, up_axis = 'XYZ'.index(track[-1]), 'XYZ'.index(up)
+    if axis == up_axis:
+        raise ValueError("Can't have the up axis the same as the track axis")
+    tvec = -vectors if track.startswith('-') else np.asarray(vectors)
+    tvec = tvec.astype(np.result_type(tvec, np.float32))
+    length = np.linalg.norm(tvec, axis=-1)
+
+    # rotate the track axis to the vector around their normal
+    unit = np.zeros(3, dtype=tvec.dtype)
+    unit[axis] = 1
+    nor = np.cross(unit, tvec)
+    others = [a for a in range(3) if a != axis]
+    parallel = np.abs(tvec[..., others]).sum(axis=-1) < 1e-4
+    nor[parallel, (axis + 1) % 3] = 1
+    nor /= np.linalg.norm(nor, axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        angle = np.arccos(np.clip(tvec[..., axis] / length, -1, 1)) / 2
+    quart = np.concatenate([np.cos(angle)[..., np.newaxis], nor * np.sin(angle)[..., np.newaxis]], axis=-1)
+
+    # roll around the vector till the up axis points up
+    fp = quaternion_to_matrix(quart)[..., :, 2]
+    if axis == 0:
+        roll = 0.5 * np.arctan2(fp[..., 2], fp[..., 1]) if up_axis == 1 else -0.5 * np.arctan2(fp[..., 1], fp[..., 2])
+    elif axis == 1:
+        roll = -0.5 * np.arctan2(fp[..., 2], fp[..., 0]) if up_axis == 0 else 0.5 * np.arctan2(fp[..., 0], fp[..., 2])
+    else:
+        roll = 0.5 * np.arctan2(-fp[..., 1], -fp[..., 0]) if up_axis == 0 else -0.5 * np.arctan2(-fp[..., 0], -fp[..., 1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        twist = np.concatenate([np.cos(roll)[..., np.newaxis], tvec * (np.sin(roll) / length)[..., np.newaxis]], axis=-1)
+    quart = quaternion_multiply(twist, quart)
+
+    # zero vectors don't rotate
+    quart[length == 0] = [1, 0, 0, 0]
+    return quart
 
 
+def rotate_towards(origin, destination, track='Z', up='Y'):
+    """ returns rotation from an origin to a destination. """
+    return track_quaternion(destination - origin, track, up)
 # endregion
 
 
+# region manual tests
+def segment_angles_benchmark(frames: int = 2000):
+    """ joint angles of both hands of a take at once compared to solving joint by joint. """
+    import time
+    rng = np.random.default_rng(0)
+    hands = rng.random((frames, 2, 21, 3)).astype(np.float32)
+    joints = np.array([[0, 5, 6], [5, 6, 7], [6, 7, 8], [0, 9, 10], [9, 10, 11], [10, 11, 12],
+                       [0, 13, 14], [13, 14, 15], [14, 15, 16], [0, 17, 18], [17, 18, 19], [18, 19, 20],
+                       [0, 1, 2], [1, 2, 3], [2, 3, 4]])
+
+    start = time.perf_counter()
+    looped = np.array([[joint_angles(hand, joints) for hand in frame] for frame in hands[:100]])
+    looped_duration = (time.perf_counter() - start) / 100
+
+    start = time.perf_counter()
+    batched = segment_angles(hands, joints[:, :2], joints[:, 1:])
+    batched_duration = (time.perf_counter() - start) / frames
+
+    print(f"JOINT ANGLES: {looped_duration * 1e6:.1f} us/frame looped, {batched_duration * 1e6:.2f} us/frame batched, "
+          f"max diff {np.abs(looped - batched[:100]).max():.2e}")
+
+
+def quaternion_difference(a, b):
+    """ max component difference of quaternions, which rotate the same if their sign differs. """
+    sign = np.sign(np.einsum('ij,ij->i', a, b))[:, np.newaxis]
+    return np.abs(a * sign - b).max()
+
+
+def mathutils_comparison(count: int = 1000, tolerance: float = 1e-5):
+    """ max differences of the numpy rotations to mathutils.
+    mathutils only converts orthonormal bases consistently across versions, skewed bases get compared
+    to mathutils of their nearest rotation, both within the tolerance. """
+    from mathutils import Matrix, Quaternion, Vector
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(count, 3, 3)).astype(np.float32)
+
+    rotations = np.array([Quaternion(rng.normal(size=4)).normalized().to_matrix() for _ in range(count)], dtype=np.float32)
+    loc, quarts, scale = decompose_matrix(np_generate_matrix(rotations[:, 0], rotations[:, 1], rotations[:, 2]))
+    expected = [Matrix([*map(list, v)]).to_4x4().decompose()[1].inverted() for v in rotations]
+    difference = quaternion_difference(quarts, np.array(expected))
+    print(f"ORTHONORMAL BASIS QUATERNION: {difference:.2e}, within tolerance {difference < tolerance}")
+
+    # palm like bases, the binormal leans towards the tangent
+    skewed = rotations.copy()
+    skewed[:, 2] += rng.uniform(-0.5, 0.5, (count, 1)) * skewed[:, 1]
+    skewed /= np.linalg.norm(skewed, axis=-1, keepdims=True)
+    for name, bases in [("SKEWED", skewed), ("RANDOM", vectors)]:
+        loc, quarts, scale = decompose_matrix(np_generate_matrix(bases[:, 0], bases[:, 1], bases[:, 2]))
+        flip = np.where(np.linalg.det(bases) < 0, -1, 1)[:, np.newaxis, np.newaxis]
+        nearest = nearest_rotation(flip * bases / np.linalg.norm(bases, axis=-2, keepdims=True))
+        expected = [Matrix([*map(list, m)]).to_quaternion().inverted() for m in nearest]
+        difference = quaternion_difference(quarts, np.array(expected))
+        print(f"{name} BASIS QUATERNION: {difference:.2e}, within tolerance {difference < tolerance}")
+
+    for order in EULER_ORDERS:
+        eulers = quaternion_to_euler(quarts, order)
+        expected = np.array([q.to_euler(order) for q in map(Quaternion, quarts)])
+        print(f"QUATERNION TO EULER {order}: {np.abs(eulers - expected).max():.2e}")
+
+    for track in ['X', 'Y', 'Z', '-X', '-Y', '-Z']:
+        for up in 'XYZ':
+            if track[-1] == up:
+                continue
+            tracked = track_quaternion(vectors[:, 0], track, up)
+            expected = np.array([Vector(v).to_track_quat(track, up) for v in vectors[:, 0]])
+            print(f"TRACK QUATERNION {track} {up}: {quaternion_difference(tracked, expected):.2e}")
+
+
 if __name__ == "__main__":
     main()
+    segment_angles_benchmark()
+    mathutils_comparison()
+# endregion
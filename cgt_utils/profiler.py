@@ -0,0 +1,96 @@
+import time
+
+import numpy as np
+
+from . import log
+
+
+class RollingSamples:
+    """ Fixed size ring buffer keeping the latest samples. """
+    def __init__(self, size: int = 512):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.count = 0
+
+    def add(self, value: float):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+
+    @property
+    def data(self):
+        """ the kept samples, not in order once the buffer wrapped. """
+        return self.samples[:min(self.count, len(self.samples))]
+
+
+class Profiler:
+    """ Records durations of named stages into rolling buffers.
+    Laps of a disabled profiler return right away, so the hooks may stay in hot paths:
+        start = profiler.start()
+        ...
+        start = profiler.lap('stage', start) """
+    percentiles = (50, 95, 99)
+
+    def __init__(self, size: int = 512):
+        self.enabled = False
+        self.size = size
+        self.stages = {}
+
+    def start(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def lap(self, stage: str, start: float):
+        """ records the time since start, returns the end as start of the next stage. """
+        if not self.enabled:
+            return 0.0
+        end = time.perf_counter()
+        samples = self.stages.get(stage)
+        if samples is None:
+            samples = self.stages[stage] = RollingSamples(self.size)
+        samples.add(end - start)
+        return end
+
+    def clear(self):
+        self.stages.clear()
+
+    def summary(self):
+        """ returns {stage: [count, mean, p50, p95, p99], ...} in seconds over the kept samples. """
+        summary = {}
+        for stage, samples in self.stages.items():
+            data = samples.data
+            summary[stage] = [samples.count, float(data.mean()), *np.percentile(data, self.percentiles).tolist()]
+        return summary
+
+    def dump_csv(self, file_name: str, samples: bool = False):
+        """ writes the summary in ms, or every kept sample if samples is set. """
+        if samples:
+            rows = [[stage, f"{value * 1000:.4f}"] for stage, s in self.stages.items() for value in s.data]
+            log.write_csv(file_name, ["stage", "ms"], rows)
+            return
+
+        header = ["stage", "count", "mean_ms", *[f"p{p}_ms" for p in self.percentiles]]
+        rows = [[stage, count, *[f"{value * 1000:.4f}" for value in values]]
+                for stage, (count, *values) in self.summary().items()]
+        log.write_csv(file_name, header, rows)
+
+
+# profiler shared by the detection stages and bridges of the process
+profiler = Profiler()
+
+
+# region manual tests
+def overhead_benchmark(laps: int = 100000):
+    """ cost per lap of the disabled and enabled profiler. """
+    test_profiler = Profiler()
+    for enabled in [False, True]:
+        test_profiler.enabled = enabled
+        start = time.perf_counter()
+        lap = test_profiler.start()
+        for _ in range(laps):
+            lap = test_profiler.lap('stage', lap)
+        duration = (time.perf_counter() - start) / laps
+        print(f"PROFILER {'ENABLED' if enabled else 'DISABLED'}: {duration * 1e9:.0f} ns per lap")
+    print(test_profiler.summary())
+
+
+if __name__ == '__main__':
+    overhead_benchmark()
+# endregion
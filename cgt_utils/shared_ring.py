@@ -0,0 +1,110 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedRing:
+    """ Ring buffer of landmark frames in shared memory with a single writer.
+    Slots carry the sequence number they have been written with, readers compare it
+    before and after copying a slot to detect frames which have been overwritten meanwhile.
+    Producer and consumer counters are stored in the header, so both sides can read them. """
+    header_dtype = np.dtype([
+        ('seq', np.int64),  # sequence of the latest published frame, starts at 1
+        ('slots', np.int64),
+        ('rows', np.int64),
+
+        # producer counters
+        ('published', np.int64),
+        ('skipped', np.int64),  # captured frames which never got detected
+        ('detect_latency', np.float64),  # capture to publish in seconds, detection start to publish for video files
+
+        # consumer counters
+        ('consumed', np.int64),
+        ('dropped', np.int64),  # published frames which got overwritten before they have been read
+        ('latency', np.float64),  # publish to consume in seconds
+    ])
+
+    def __init__(self, name: str = None, slots: int = 8, rows: int = 543, create: bool = False):
+        if create:
+            size = self.header_dtype.itemsize + slots * self.slot_dtype(rows).itemsize
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = self._attach(name)
+
+        self.header = np.ndarray((), dtype=self.header_dtype, buffer=self.shm.buf)
+        if create:
+            self.header[()] = 0
+            self.header['slots'], self.header['rows'] = slots, rows
+
+        slots, rows = int(self.header['slots']), int(self.header['rows'])
+        self.slots = np.ndarray(
+            (slots,), dtype=self.slot_dtype(rows), buffer=self.shm.buf, offset=self.header_dtype.itemsize)
+        if create:
+            self.slots['seq'] = 0
+
+    @staticmethod
+    def slot_dtype(rows: int):
+        return np.dtype([
+            ('seq', np.int64),
+            ('frame', np.int64),
+            ('meta', np.int64),
+            ('count', np.int64),  # amount of used landmark rows
+            ('timestamp', np.float64),  # stream timestamp
+            ('published', np.float64),  # perf counter at publishing
+            ('landmarks', np.float32, (rows, 3)),
+        ])
+
+    @staticmethod
+    def _attach(name: str):
+        # attaching processes shouldn't unlink the memory when they exit
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            return shared_memory.SharedMemory(name=name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def seq(self):
+        return int(self.header['seq'])
+
+    def publish(self, frame: int, landmarks: np.ndarray, meta: int = 0, timestamp: float = 0.0, published: float = 0.0):
+        """ writes a frame into the oldest slot, landmarks exceeding the slot rows get cut. """
+        seq = self.seq + 1
+        idx = seq % len(self.slots)
+        count = min(len(landmarks), self.slots['landmarks'].shape[1])
+
+        # mark the slot as being written
+        self.slots['seq'][idx] = -1
+        self.slots['landmarks'][idx, :count] = landmarks[:count]
+        self.slots['frame'][idx] = frame
+        self.slots['meta'][idx] = meta
+        self.slots['count'][idx] = count
+        self.slots['timestamp'][idx] = timestamp
+        self.slots['published'][idx] = published
+        self.slots['seq'][idx] = seq
+
+        self.header['seq'] = seq
+        self.header['published'] += 1
+        return seq
+
+    def read(self, seq: int):
+        """ returns a copy of the slot written with the sequence number,
+        None if it has been overwritten or is being written. """
+        idx = seq % len(self.slots)
+        if self.slots['seq'][idx] != seq:
+            return None
+        frame = self.slots[idx].copy()
+        if self.slots['seq'][idx] != seq:
+            return None
+        return frame
+
+    def close(self):
+        # views on the buffer have to be released before closing
+        self.header, self.slots = None, None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
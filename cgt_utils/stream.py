@@ -1,15 +1,106 @@
+import queue
+import threading
 import time
+from abc import ABC, abstractmethod
 
 import cv2
+import numpy as np
 
 
-class Webcam:
+class Stream(ABC):
+    """ Frame source shared by webcam and video file input.
+    Updating stores the captured bgr frame as raw, converting prepares the rgb frame for inference
+    and the bgr frame to draw on in reused buffers. Webcams get mirrored while converting.
+    The preview may only show every nth frame at a lower scale, without preview nothing gets drawn. """
+    capture = None
+    mirror = False
+
+    def __init__(self, title: str = "Stream Detection"):
+        self.title = title
+        # skip drawing the detection results, f.e. in worker processes
+        self.preview = True
+        self.preview_every, self.preview_scale = 1, 1.0
+        # whether the current frame gets drawn
+        self.drawing = False
+        self.updated, self.raw, self.frame = None, None, None
+        self.rgb, self.scaled = None, None
+        self.timestamp = None
+        self.converted, self.shown = 0, False
+
+    @abstractmethod
+    def update(self):
+        """ reads the next frame into raw, sets updated to whether a frame got read. """
+        pass
+
+    @staticmethod
+    def reuse(buffer, shape: tuple):
+        """ returns the buffer if it fits the shape, a new buffer otherwise. """
+        if buffer is None or buffer.shape != shape:
+            return np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def convert(self):
+        """ converts the raw frame to rgb in one pass and returns it, the frame to draw on only gets
+        prepared if the frame gets previewed. the returned buffer gets overwritten by the next conversion. """
+        self.rgb = self.reuse(self.rgb, self.raw.shape)
+        if self.mirror:
+            # reversing the bytes of a row mirrors the pixels and swaps bgr to rgb at once
+            rows = len(self.raw)
+            cv2.flip(self.raw.reshape(rows, -1), 1, dst=self.rgb.reshape(rows, -1))
+        else:
+            cv2.cvtColor(self.raw, cv2.COLOR_BGR2RGB, dst=self.rgb)
+
+        self.drawing = self.preview and self.converted % self.preview_every == 0
+        self.converted += 1
+        if self.drawing:
+            self.frame = self.preview_frame()
+        return self.rgb
+
+    def preview_frame(self):
+        """ returns the bgr frame to draw on in the preview scale. """
+        # converting the mirrored rgb frame back is faster than mirroring the raw frame
+        source = self.rgb if self.mirror else self.raw
+        if self.preview_scale < 1.0:
+            height, width = source.shape[:2]
+            size = max(1, int(width * self.preview_scale)), max(1, int(height * self.preview_scale))
+            self.scaled = self.reuse(self.scaled, (size[1], size[0], 3))
+            source = cv2.resize(source, size, dst=self.scaled, interpolation=cv2.INTER_AREA)
+        if not self.mirror:
+            return source
+
+        frame = self.reuse(self.frame, source.shape)
+        cv2.cvtColor(source, cv2.COLOR_RGB2BGR, dst=frame)
+        return frame
+
+    def draw(self):
+        cv2.imshow(self.title, self.frame)
+        self.shown = True
+
+    def exit_stream(self):
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            return True
+        else:
+            return False
+
+    @abstractmethod
+    def release(self):
+        """ stops the source, releases the capture. """
+        if self.capture is not None:
+            self.capture.release()
+
+    def __del__(self):
+        self.release()
+        if self.shown:
+            cv2.destroyWindow(self.title)
+
+
+class Webcam(Stream):
     def __init__(self,
                  camera_index: int = 0,
                  title: str = "Stream Detection",
                  width: int = 640,
                  height: int = 480):
-
+        super().__init__(title)
         self.capture = cv2.VideoCapture(camera_index)
         time.sleep(1.000)
         if not self.capture.isOpened():
@@ -18,46 +109,263 @@ class Webcam:
         self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
         self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
         self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.mirror = True
 
-        self.title = title
-        self.updated, self.frame = None, None
-        self.color_spaces = {
-            'rgb': cv2.COLOR_BGR2RGB,
-            'bgr': cv2.COLOR_RGB2BGR
-        }
+    def update(self):
+        # reads into the previous frame if the size didn't change
+        self.updated, self.raw = self.capture.read(self.raw)
+        self.timestamp = time.perf_counter()
+
+    def release(self):
+        super().release()
+
+
+class ThreadedWebcam(Webcam):
+    """ Grabs frames on a background thread into a small preallocated ring buffer.
+    Update returns the newest frame immediately, so camera exposure and usb latency
+    don't stall the modal loop. Frames replaced before they have been read count as dropped,
+    updates without a new frame as idle. """
+    def __init__(self,
+                 camera_index: int = 0,
+                 title: str = "Stream Detection",
+                 width: int = 640,
+                 height: int = 480,
+                 buffer_size: int = 3):
+        super().__init__(camera_index, title, width, height)
+        self.buffer_size = max(2, buffer_size)
+        self.buffer, self.timestamps = None, np.zeros(self.buffer_size, dtype=np.float64)
+
+        # sequence of the latest captured and read frame
+        self.captured, self.consumed = 0, 0
+        self.dropped, self.idle = 0, 0
+
+        self._lock = threading.Lock()
+        self._new_frame = threading.Event()
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+
+    def _capture_loop(self):
+        while self._running and self.capture.isOpened():
+            if not self.capture.grab():
+                time.sleep(0.005)
+                continue
+            timestamp = time.perf_counter()
+
+            # slots get written outside the lock, the reader only accesses the latest captured slot
+            slot = self.captured % self.buffer_size
+            if self.buffer is None:
+                # allocate once the actual frame size is known
+                ok, frame = self.capture.retrieve()
+                if not ok:
+                    continue
+                self.buffer = np.empty((self.buffer_size, *frame.shape), dtype=frame.dtype)
+                self.buffer[slot] = frame
+            else:
+                ok, _ = self.capture.retrieve(self.buffer[slot])
+                if not ok:
+                    continue
+
+            with self._lock:
+                self.timestamps[slot] = timestamp
+                self.captured += 1
+                self._new_frame.set()
+
+    def wait(self, timeout: float = None):
+        """ blocks till a frame has been captured which hasn't been read yet. """
+        return self._new_frame.wait(timeout)
 
     def update(self):
-        self.updated, frame = self.capture.read()
-        self.frame = cv2.flip(frame, 1)
+        with self._lock:
+            if self.captured == self.consumed:
+                self.updated = False
+                self.idle += 1
+                return
 
-    def set_color_space(self, space):
-        self.frame = cv2.cvtColor(self.frame, self.color_spaces[space])
+            self.dropped += self.captured - self.consumed - 1
+            self.consumed = self.captured
+            self._new_frame.clear()
+            slot = (self.captured - 1) % self.buffer_size
+            self.timestamp = self.timestamps[slot]
+            # the slot gets overwritten after buffer size captures, so it's converted right away
+            self.raw = self.buffer[slot]
+            self.updated = True
 
-    def draw(self):
-        cv2.imshow(self.title, self.frame)
+    def release(self):
+        """ stops capturing, the capture thread references the stream till then. """
+        self._running = False
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        super().release()
 
-    def exit_stream(self):
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            return True
-        else:
-            return False
 
-    def __del__(self):
-        self.capture.release()
-        cv2.destroyAllWindows()
+class VideoFileSource(Stream):
+    """ Decodes a video file ahead on a worker thread into a bounded queue.
+    Frames are available as fast as they get consumed, so offline footage processes at inference speed.
+    The capture gets released at the end of the frame range. """
+    def __init__(self,
+                 path: str,
+                 title: str = "Stream Detection",
+                 queue_size: int = 32,
+                 frame_start: int = 0,
+                 frame_end: int = None):
+        super().__init__(title)
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise IOError(f"Cannot open video file: {path}")
+
+        # some containers and streams don't report their frame count, those decode till reading fails
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_start, self.frame_end = 0, self.frame_count
+        # source frame index of the current frame
+        self.frame_index = None
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop, self._thread = threading.Event(), None
+        self.seek(frame_start, frame_end)
+
+    def seek(self, frame_start: int = 0, frame_end: int = None):
+        """ restart decoding at the start of the frame range [frame_start, frame_end). """
+        self._stop_decoding()
+        if not self.capture.isOpened():
+            self.capture.open(self.path)
+
+        frame_count = self.frame_count if self.frame_count is not None else np.inf
+        self.frame_start = int(min(max(0, frame_start), frame_count))
+        self.frame_end = self.frame_count if frame_end is None else int(min(max(self.frame_start, frame_end), frame_count))
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, self.frame_start)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._decode_loop, daemon=True)
+        self._thread.start()
+
+    def _decode_loop(self):
+        try:
+            frame_end = self.frame_end if self.frame_end is not None else np.iinfo(np.int64).max
+            for frame_index in range(self.frame_start, frame_end):
+                ok, frame = self.capture.read()
+                if not ok:
+                    break
+
+                # fallback to the nominal frame rate if the container doesn't provide timestamps
+                timestamp = self.capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+                if timestamp <= 0 and frame_index > 0:
+                    timestamp = frame_index / self.fps
+
+                if not self._put((frame_index, timestamp, frame)):
+                    return
+        finally:
+            # ends the stream even if decoding failed, so update never waits on a dead decoder
+            self._put(None)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _stop_decoding(self):
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    def update(self):
+        if not self.capture.isOpened():
+            self.updated = False
+            return
+
+        item = self._next_item()
+        if item is None:
+            # end of range, the decoder has finished
+            self.updated = False
+            self.capture.release()
+            return
+
+        self.frame_index, self.timestamp, self.raw = item
+        self.updated = True
+
+    def _next_item(self, timeout: float = 0.5):
+        """ next decoded item, None at the end of the range or if the decoder stopped without finishing it. """
+        while True:
+            try:
+                return self._queue.get(timeout=timeout)
+            except queue.Empty:
+                if self._thread is None or not self._thread.is_alive():
+                    # the decoder may have queued its last items right before exiting
+                    try:
+                        return self._queue.get_nowait()
+                    except queue.Empty:
+                        return None
+
+    def release(self):
+        """ stops decoding, the decoder thread references the stream till then. """
+        self._stop_decoding()
+        super().release()
 
 
 def main():
     stream = Webcam()
     while stream.capture.isOpened():
         stream.update()
-        stream.set_color_space('rgb')
-        stream.set_color_space('bgr')
+        stream.convert()
         stream.draw()
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
     del stream
 
 
+# region manual tests
+def conversion_benchmark(frames: int = 100):
+    """ time and transient allocations per frame of preparing webcam frames for inference and preview,
+    comparing flip, bgr to rgb and back to bgr with the conversion into reused buffers. """
+    import tracemalloc
+
+    class Frames(Stream):
+        mirror = True
+
+        def update(self):
+            pass
+
+        def release(self):
+            pass
+
+    def legacy(s):
+        frame = cv2.flip(s.raw, 1)
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+
+    for width, height in [(1280, 720), (1920, 1080)]:
+        s = Frames()
+        s.raw = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+        for name, variant in [("legacy", legacy), ("no preview", Stream.convert), ("preview", Stream.convert)]:
+            s.preview = name == "preview"
+            variant(s)
+
+            tracemalloc.start()
+            variant(s)
+            allocated = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            for _ in range(frames):
+                variant(s)
+            duration = (time.perf_counter() - start) / frames
+            print(f"{height}p {name:>10}: {duration * 1000:.2f} ms/frame, "
+                  f"{allocated / 2 ** 20:.1f} MiB allocated/frame")
+
+
 if __name__ == "__main__":
     main()
+# endregion